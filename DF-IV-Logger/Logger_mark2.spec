@@ -6,7 +6,7 @@ block_cipher = None
 
 a = Analysis(
     ['Loger_Mark2.py'],
-    pathex=[],
+    pathex=['../common'],
     binaries=[],
     datas=[],
     hiddenimports=[],
@@ -1,54 +1,205 @@
 import os
 import pandas as pd
+import argparse
+import concurrent.futures
 import datetime
-import zipfile
+import json
 import re
 import shutil
+import tempfile
+import threading
+import time
 from PyQt6 import QtCore, QtGui, QtWidgets
 import sys
 from output import Ui_MainWindow
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from pcbjc import read_info_value
 
 
-def get_logs_list(folder):
+def app_data_folder():
+    """
+    The per-user folder the Logger keeps its data in, between runs.
+
+    %LOCALAPPDATA%\\DF-IV-Logger on Windows. Elsewhere it is DF-IV-Logger under
+    $XDG_DATA_HOME or ~/.local/share. The temp folder is used when none of them is known.
+    """
+    base = os.environ.get('LOCALAPPDATA')
+    if not base and os.name != 'nt':
+        base = os.environ.get('XDG_DATA_HOME')
+        if not base and os.path.expanduser('~') != '~':
+            base = os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base or tempfile.gettempdir(), 'DF-IV-Logger')
+
+
+# parsed print jobs of earlier runs, keyed by log file name, size and mtime. It is kept
+# out of C:/output because that folder is wiped on every run, and out of the temp folder
+# because temp purges would make the next run parse everything again
+INDEX_PATH = os.path.join(app_data_folder(), 'print_logs_index.json')
+INDEX_VERSION = 1
+# recipe names read from the pcbjc archives, keyed by archive path, size and mtime
+RECIPES_PATH = os.path.join(tempfile.gettempdir(), 'DF-IV-Logger', 'recipes_index.json')
+INTERESTED = ['File Name', 'Recipe', 'DragonflyPC', 'Initial Time Estimation', 'StartTime', 'End Time',  'Conductor Slice Thickness',
+              'Insulator Slice Thickness', 'Tray Temp', 'Resolution', 'Insulator Slices', 'Conductor Slices', 'Total Slices', 'Percentage', 'Finish Status', 'Time spent']
+# threads parsing the new and changed logs, the work is mostly waiting on the disk, set with -j/--workers
+WORKERS = min(8, 2 * (os.cpu_count() or 1))
+# stages of parse_job, in the order of the timing breakdown
+STAGES = ['read log', 'time estimation', 'recipe', 'parse lines']
+# date and time at the start of a TimeEstimationLogs line
+TIMESTAMP = re.compile(r'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-2][0-9]\:[0-6][0-9]\:[0-6][0-9]')
+
+
+_worker = threading.local()
+
+
+def report(text, replace=False):
+    """
+    Show a message in the text browser, or keep it for the main thread when called from a collection worker.
+
+    Qt widgets may only be used from the main thread, collect_jobs shows the messages
+    kept by a worker once it merges the job the worker parsed.
+
+    Args:
+        text (str): The message.
+        replace (bool): Replace the text of the browser instead of appending to it.
+    """
+    messages = getattr(_worker, 'messages', None)
+    if messages is not None:
+        messages.append((text, replace))
+    elif replace:
+        ui.textBrowser.setPlainText(text)
+    else:
+        ui.textBrowser.append(text)
+
+
+def normalize_name(name):
+    """
+    Keep only the letters and spaces of a name, the form print job folders are matched in.
+    """
+    return re.sub('[^a-zA-Z ]+', '', name)
+
+
+class FolderIndex:
+    """
+    The entries of a folder, listed once with os.scandir and indexed by normalized name.
+
+    Looking a print job up is a dict hit instead of a new listing of the folder. A lookup
+    that misses the dict first searches the name in the text of all the entry names, so a
+    print job without an entry is turned down by one substring search, and remembered. Only
+    names found in that text fall back to a scan of the entries, in listing order.
+
+    Attributes:
+        folder (str): The path to the folder.
+        missing (bool): True if the folder does not exist, the index is empty then.
+        logs (list): Names of the .log files.
+        folders (list): Names of the other entries.
+        print_seqs (list): Names of the entries with 'PrintSeq' in their name.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.missing = False
+        self.logs = []
+        self.folders = []
+        self.print_seqs = []
+        self._folders_by_name = {}
+        self._print_seqs_by_name = {}
+        self._misses = set()
+        try:
+            with os.scandir(folder) as entries:
+                names = [entry.name for entry in entries]
+        except FileNotFoundError:
+            self.missing = True
+            names = []
+        for name in names:
+            if '.log' in name:
+                self.logs.append(name)
+            else:
+                self.folders.append(name)
+                self._folders_by_name.setdefault(normalize_name(name), []).append(name)
+            if 'PrintSeq' in name:
+                self.print_seqs.append(name)
+                self._print_seqs_by_name.setdefault(normalize_name(name.split('PrintSeq')[0]), []).append(name)
+        # file names cannot hold a NUL, so a name found in these texts is inside one entry name
+        self._texts = {'folders': '\0'.join(self.folders),
+                       'normalized folders': '\0'.join(normalize_name(name) for name in self.folders),
+                       'print seqs': '\0'.join(self.print_seqs)}
+
+    def _absent(self, PJName, text):
+        """
+        Check whether no entry name of a text of the index contains the print job name, misses are remembered.
+        """
+        if (PJName, text) in self._misses:
+            return True
+        if PJName in self._texts[text]:
+            return False
+        self._misses.add((PJName, text))
+        return True
+
+    def find_folder(self, PJName, match, normalized=False):
+        """
+        Return the first folder of a print job for which match(folder name) is true, None if there is none.
+
+        The folders with the normalized name of the print job are tried first, then the
+        others in listing order. match must only accept folders whose name, or normalized
+        name when normalized is true, contains the print job name.
+        """
+        for name in self._folders_by_name.get(normalize_name(PJName), []):
+            if match(name):
+                return name
+        if self._absent(PJName, 'normalized folders' if normalized else 'folders'):
+            return None
+        for name in self.folders:
+            if match(name):
+                return name
+        return None
+
+    def find_print_seq(self, PJName):
+        """
+        Return the first 'PrintSeq' entry with the print job name in its name, None if there is none.
+        """
+        for name in self._print_seqs_by_name.get(normalize_name(PJName), []):
+            if PJName in name:
+                return name
+        if self._absent(PJName, 'print seqs'):
+            return None
+        for name in self.print_seqs:
+            if PJName in name:
+                return name
+        return None
+
+
+def get_logs_list(logs_index):
     """Return a list of logs files in the given folder.
 
     Args:
-        folder (str): The path to the folder containing logs files.
+        logs_index (FolderIndex): The index of the folder containing logs files.
 
     Returns:
         list: A list of logs files in the given folder.
     """
-    logs_list = []
-    try:
-        for filename in os.listdir(folder):
-            if not ".log" in filename:
-                continue
-            else:
-                logs_list.append(filename)
-    except FileNotFoundError:
-        ui.textBrowser.append(f"No such folder: {folder}")
-    return logs_list
+    if logs_index.missing:
+        ui.textBrowser.append(f"No such folder: {logs_index.folder}")
+    return logs_index.logs
 
 
-def get_source_path(folder, PJName, recipename):
+def get_source_path(logs_index, PJName, recipename):
     """
     Returns the path of the recipe folder for a given print job and recipe name.
 
     Args:
-        folder (str): The path of the directory to search for print job logs.
+        logs_index (FolderIndex): The index of the directory to search for print job logs.
         PJName (str): The name of the print job.
         recipename (str): The name of the recipe.
 
     Returns:
         str: The path of the recipe folder if found, otherwise an empty string.
     """
-    for filename in os.listdir(folder):
-        if not PJName in filename or '.log' in filename:
-            continue
-        if recipename in os.listdir(folder+'/'+filename+'/'+'Recipe'):
-            return folder+'/'+filename+'/'+'Recipe'
-
-    return ''
+    folder = logs_index.folder
+    filename = logs_index.find_folder(
+        PJName, lambda name: PJName in name and recipename in os.listdir(folder+'/'+name+'/'+'Recipe'))
+    if filename is None:
+        return ''
+    return folder+'/'+filename+'/'+'Recipe'
 
 
 def open_file(path):
@@ -70,7 +221,7 @@ def save_file(log, folder):
     """Save the log data to a CSV file in the specified folder.
 
     Args:
-        log (list): A list of dictionaries containing log data.
+        log (list or pandas.DataFrame): The rows of the log data, a list of dictionaries or a data frame.
         folder (str): The folder path where the CSV file will be saved.
 
     Returns:
@@ -89,70 +240,89 @@ def save_file(log, folder):
     return dict, filename
 
 
-def get_te_file(path, filename):
+def get_te_file(te_index, filename):
     """Searches for a file in a given path with a specific filename and 'PrintSeq' in its name.
 
     Args:
-        path (str): Path to the directory where the file should be searched.
+        te_index (FolderIndex): Index of the directory where the file should be searched.
         filename (str): Name of the file to be searched.
 
     Returns:
         str: Name of the file if found, otherwise None.
     """
-    try:
-        for file in os.listdir(path):
-            if not filename in file:
-                continue
-            if not 'PrintSeq' in file:
-                continue
-            return file
-    except FileNotFoundError:
-        print(f"Directory {path} not found.")
+    if te_index.missing:
+        print(f"Directory {te_index.folder} not found.")
         return None
+    return te_index.find_print_seq(filename)
 
 
-def get_folder_log_path(folder, filename):
+def get_folder_log_path(logs_index, filename):
     """
-    Given a folder and filename, returns the full path to the folder containing 
-    the log file associated with the filename. Returns 'no such folder' if the 
+    Given a folder index and filename, returns the full path to the folder containing
+    the log file associated with the filename. Returns 'no such folder' if the
     specified folder does not exist.
 
     Args:
-    - folder (str): path to the folder to search for the log file
+    - logs_index (FolderIndex): index of the folder to search for the log file
     - filename (str): name of the file whose associated log file we want to find
 
     Returns:
-    - new_folder (str): path to the folder containing the log file associated 
-                        with the given filename, or 'no such folder' if the 
+    - new_folder (str): path to the folder containing the log file associated
+                        with the given filename, or 'no such folder' if the
                         specified folder does not exist
 
-    Raises:
-    - Exception: if there was an error accessing the specified folder
+    """
+    if logs_index.missing:
+        report('no such folder')
+        return 'no such folder'
+    new_folder = logs_index.find_folder(
+        filename, lambda name: filename in normalize_name(name.replace('.log', '')), normalized=True)
+    if new_folder is None:
+        return 'Log file not found.'
+    return logs_index.folder + '/' + new_folder
 
+
+def first_and_last_lines(path, block_size=8192):
     """
+    Reads the first line and the last non-empty line of a file without reading what is between them.
 
-    try:
-        new_folder = ''
-        for file in os.listdir(folder):
-            if new_folder != '':
+    The last line is found by reading the file backwards from its end in blocks, blank
+    lines at the end are skipped, so memory stays bounded by the block size and the
+    length of the two lines whatever the size of the file.
+
+    Args:
+        path (str): Path to the file.
+        block_size (int): Number of bytes read at a time from the end of the file.
+
+    Returns:
+        tuple: (first line, last non-empty line) as str, the last line is None if no
+        non-empty line follows the first one.
+    """
+    with open(path, 'rb') as f:
+        first = f.readline()
+        first_end = f.tell()
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        tail = b''
+        while position > first_end:
+            step = min(block_size, position - first_end)
+            position -= step
+            f.seek(position)
+            tail = (f.read(step) + tail).rstrip()
+            newline = tail.rfind(b'\n')
+            if newline != -1:
+                tail = tail[newline + 1:]
                 break
-            if '.log' in file:
-                continue
-            if not filename in re.sub('[^a-zA-Z ]+', '', file.replace('.log', '')):
-                continue
-            new_folder = folder + '/' + file
-        if new_folder == '':
-            return 'Log file not found.'
-        return new_folder
-    except FileNotFoundError:
-        ui.textBrowser.append('no such folder')
-        return 'no such folder'
+    last = tail.strip()
+    return first.decode(errors='replace'), last.decode(errors='replace') if last else None
 
 
 def time_estimation_calc(TE_logs, file):
     """
     Calculates the time estimation based on the start and end times in the given file.
 
+    Only the first line and the last non-empty line of the file are read, see first_and_last_lines.
+
     Args:
         TE_logs (str): Path to the folder containing the TE log file.
         file (str): Name of the TE log file.
@@ -166,24 +336,19 @@ def time_estimation_calc(TE_logs, file):
         ValueError: If the start and end times cannot be parsed from the file.
     """
     try:
-        with open(TE_logs+'/'+file) as f:
-            f = f.readlines()
-        if len(f) < 2:
-            raise IndexError("File is empty or has fewer than 2 lines")
-        start_time = f[0]
-        end_time = f[len(f)-1]
-        temp1 = re.search(
-            '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-2][0-9]\:[0-6][0-9]\:[0-6][0-9]', start_time)
-        temp2 = re.search(
-            '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-2][0-9]\:[0-6][0-9]\:[0-6][0-9]', end_time)
-        if not temp1 or not temp2:
-            raise ValueError("Could not parse start and end times from file")
-        time_estimation = datetime.datetime.strptime(end_time[temp2.regs[0][0]:temp2.regs[0][1]], '%Y-%m-%d %H:%M:%S') - datetime.datetime.strptime(
-            start_time[temp1.regs[0][0]:temp1.regs[0][1]], '%Y-%m-%d %H:%M:%S')
-        return str(time_estimation)
+        start_time, end_time = first_and_last_lines(TE_logs+'/'+file)
     except FileNotFoundError as exc:
         raise FileNotFoundError(
-            "The " + exc + " file or folder does not exist")
+            "The " + str(exc.filename) + " file or folder does not exist") from exc
+    if end_time is None:
+        raise IndexError("File is empty or has fewer than 2 lines")
+    temp1 = TIMESTAMP.search(start_time)
+    temp2 = TIMESTAMP.search(end_time)
+    if not temp1 or not temp2:
+        raise ValueError("Could not parse start and end times from file")
+    time_estimation = datetime.datetime.strptime(temp2.group(), '%Y-%m-%d %H:%M:%S') - datetime.datetime.strptime(
+        temp1.group(), '%Y-%m-%d %H:%M:%S')
+    return str(time_estimation)
 
 
 def calculate_percentage(dictionary):
@@ -218,12 +383,12 @@ def calculate_percentage(dictionary):
     return percentage
 
 
-def save_recipes(log_path):
+def save_recipes(logs_index):
     """
     Saves recipes to an output folder.
 
     Args:
-        log_path (str): The path to the log folder.
+        logs_index (FolderIndex): The index of the log folder.
 
     Returns:
         None
@@ -247,7 +412,7 @@ def save_recipes(log_path):
         os.mkdir('C:/output/recipes')
     for rec in recipes:
         try:
-            shutil.copytree(get_source_path(log_path, rec.get('PJ name'), rec.get(
+            shutil.copytree(get_source_path(logs_index, rec.get('PJ name'), rec.get(
                 'name')), 'C:/output/recipes/'+rec.get('name'))
         except FileNotFoundError:
             print("Error: source path not found.")
@@ -276,17 +441,24 @@ def create_output_folder(path):
     return
 
 
-def find_recipe(log_folder):
+def find_recipe(log_folder, recipe_cache=None):
     """
     Finds the recipe name for a given PCB job file in the specified log folder.
 
     Args:
         log_folder (str): Path to the folder containing the PCB job files.
+        recipe_cache (RecipeCache): Recipes of the archives read by earlier runs, the
+            archive is read directly without it.
 
     Returns:
         str: The name of the recipe used for the PCB job file, or False if the recipe cannot be found.
     """
-    for pcbjc in os.listdir(log_folder):
+    try:
+        entries = os.listdir(log_folder)
+    except FileNotFoundError:
+        # get_folder_log_path found no folder for the print job
+        return False
+    for pcbjc in entries:
         if 'Recipe' in pcbjc:
             return os.listdir(log_folder + '/' + pcbjc)[0]
 
@@ -294,12 +466,11 @@ def find_recipe(log_folder):
             continue
 
         try:
-            archive = zipfile.ZipFile(log_folder + '/' + pcbjc, 'r')
-            imgfile = archive.open('pcbj.info')
-            data = pd.read_json(imgfile, orient='index').to_dict()
-            return data[0].get('Recipe')
+            if recipe_cache is not None:
+                return recipe_cache.recipe(log_folder + '/' + pcbjc)
+            return read_info_value(log_folder + '/' + pcbjc, 'Recipe')
         except PermissionError:
-            ui.textBrowser.setPlainText('No permision to open the log files')
+            report('No permision to open the log files', replace=True)
             return False
         except FileNotFoundError:
             return False
@@ -318,8 +489,7 @@ def real_time_calculation(log_dict, total_time):
         total_time (int): The updated total time spent on all PJs.
     """
     if not log_dict.get('End Time') or not log_dict.get('StartTime'):
-        ui.textBrowser.append(
-            'Start time or end time does not exist for project: ' + log_dict['File Name'])
+        report('Start time or end time does not exist for project: ' + log_dict['File Name'])
         return False
 
     time_wasted = datetime.datetime.strptime(
@@ -332,6 +502,297 @@ def real_time_calculation(log_dict, total_time):
     return time_wasted, total_time
 
 
+def load_index(path):
+    """
+    Load the print log index written by an earlier run.
+
+    Args:
+        path (str): The path to the index file.
+
+    Returns:
+        dict: Index entries keyed by log file name, each with the 'size' and 'mtime_ns' of
+        the log when it was parsed and its 'row', None for a job that was left out. Empty
+        if there is no index yet, or it is unreadable or from another version.
+    """
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(index, dict) or index.get('version') != INDEX_VERSION:
+        return {}
+    return index.get('jobs', {})
+
+
+def save_index(path, jobs):
+    """
+    Write the print log index, replacing the old one only once the new one is complete.
+
+    Args:
+        path (str): The path to the index file.
+        jobs (dict): Index entries keyed by log file name, see load_index.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump({'version': INDEX_VERSION, 'jobs': jobs}, f)
+    os.replace(temp_path, path)
+
+
+class RecipeCache:
+    """
+    Recipe names of the pcbjc archives, kept between runs so an archive is only opened once.
+
+    Entries are keyed by archive path and hold the size and mtime of the archive when it
+    was read, an archive that changed since is read again. The cache is stored like the
+    print log index, see load_index, and can be shared by the collection workers.
+
+    Attributes:
+        path (str): The path to the cache file.
+        hits (int): Number of recipes taken from the cache.
+        misses (int): Number of archives read.
+    """
+
+    def __init__(self, path=RECIPES_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._recipes = load_index(path)
+        self._lock = threading.Lock()
+
+    def recipe(self, archive_path):
+        """
+        The recipe of an archive, read from pcbj.info only if the cache has no entry for this version of it.
+
+        Args:
+            archive_path (str): The path to the .pcbjc file.
+
+        Returns:
+            str: The recipe name, or None for archives without one.
+        """
+        stat = os.stat(archive_path)
+        entry = self._recipes.get(archive_path)
+        if entry is not None and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            with self._lock:
+                self.hits += 1
+            return entry['recipe']
+        recipe = read_info_value(archive_path, 'Recipe')
+        with self._lock:
+            self.misses += 1
+            self._recipes[archive_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'recipe': recipe}
+        return recipe
+
+    def save(self):
+        """
+        Write the cache if an archive was read since it was loaded.
+        """
+        if self.misses:
+            with self._lock:
+                save_index(self.path, dict(self._recipes))
+
+
+def parse_job(logs_index, te_index, filename, timings=None, recipe_cache=None):
+    """
+    Parse the log of one print job into a row of the statistics.
+
+    Args:
+        logs_index (FolderIndex): The index of the PrintLogs folder.
+        te_index (FolderIndex): The index of the TimeEstimationLogs folder.
+        filename (str): The name of the .log file of the job.
+        timings (dict): Seconds spent in each of the STAGES, the time of this job is added to it.
+        recipe_cache (RecipeCache): Recipes of the archives read by earlier runs, see find_recipe.
+
+    Returns:
+        dict: The row of the job, keyed by the INTERESTED fields, or None if the job
+        is left out of the statistics.
+    """
+    if timings is None:
+        timings = {}
+    start = time.perf_counter()
+
+    def lap(stage):
+        nonlocal start
+        now = time.perf_counter()
+        timings[stage] = timings.get(stage, 0.0) + now - start
+        start = now
+
+    log_dict = dict()
+    for key in INTERESTED:
+        log_dict[key] = ''
+    try:
+        with open(logs_index.folder+'/'+filename) as f:
+            f = f.readlines()
+    except FileNotFoundError:
+        report('no such folder' + filename)
+        return None
+    lap('read log')
+    ### add file name to dict ###
+    log_dict["File Name"] = filename[re.search(
+        '[a-zA-Z]+_* *[a-zA-Z]+|[a-zA-Z]+', filename).regs[0][0]:re.search('[a-zA-Z]+_* *[a-zA-Z]+|[a-zA-Z]+', filename).regs[0][1]]
+    ### get Time estimation file ###
+    time_estimation_file = get_te_file(te_index, log_dict["File Name"])
+    if time_estimation_file:
+        log_dict['Initial Time Estimation'] = time_estimation_calc(
+            te_index.folder, time_estimation_file)
+    lap('time estimation')
+    ### add Recipe name to Dict ###
+    log_older = get_folder_log_path(logs_index, log_dict["File Name"])
+    if not log_older:
+        return None
+    recipe = find_recipe(log_older, recipe_cache)
+    if recipe:
+        log_dict['Recipe'] = recipe
+    else:
+        log_dict['Recipe'] = 'no pcbjc file'
+        report('no pcbjc file', replace=True)
+    lap('recipe')
+    ############## end #################
+    for line in f:
+        if line == "\n" or "-----" in line:
+            continue
+        key, value = line.split(':\t')
+        value = value.rstrip()
+        for inter in INTERESTED:
+            if inter in key:
+                if not log_dict.get(key):
+                    log_dict[inter] = value
+    ############# add actual Printing time ############################
+
+    result = real_time_calculation(log_dict, 0)
+    if not result:
+        lap('parse lines')
+        return None
+    time_wasted, _ = result
+    log_dict['Percentage'] = round(calculate_percentage(log_dict), 4)*100
+    log_dict['Time spent'] = str(time_wasted)
+    lap('parse lines')
+    # point to add more calculations for logging
+    return log_dict
+
+
+def _parse_job_task(logs_index, te_index, filename, recipe_cache):
+    """
+    Run parse_job in a collection worker.
+
+    Returns:
+        tuple: (row, timings, messages), the result of parse_job, the seconds spent in
+        each stage and the messages to show, see report.
+    """
+    _worker.messages = []
+    timings = {}
+    try:
+        row = parse_job(logs_index, te_index, filename, timings, recipe_cache)
+        return row, timings, _worker.messages
+    finally:
+        _worker.messages = None
+
+
+def collect_jobs(logs_index, te_index, index_path=INDEX_PATH, workers=None, recipe_cache=None):
+    """
+    Collect the rows of every print job, parsing only the logs that are new or changed since the last run.
+
+    The new and changed logs are parsed by a pool of worker threads, reading the logs,
+    the TimeEstimationLogs files and the archives at the same time. Their results are
+    merged in log file order, so the rows, the total time and the messages are the same
+    as a parse of one log after the other.
+
+    Args:
+        logs_index (FolderIndex): The index of the PrintLogs folder.
+        te_index (FolderIndex): The index of the TimeEstimationLogs folder.
+        index_path (str): The index of the earlier runs, see load_index.
+        workers (int): Number of threads parsing logs, 1 parses them in the calling thread,
+            WORKERS by default.
+        recipe_cache (RecipeCache): Recipes of the archives read by earlier runs, by default
+            the one kept at RECIPES_PATH. It is saved once the logs are parsed.
+
+    Returns:
+        tuple: (rows, total_time, parsed, file_count, timings). The rows of the jobs in log
+        file order, the total printing time in seconds, the number of logs parsed in this
+        run, the number of logs found, and the seconds spent in each of the STAGES summed
+        over the workers, plus the 'index' time spent on the index and the wall clock
+        'parse' time of the parsing.
+    """
+    start = time.perf_counter()
+    file_list = get_logs_list(logs_index)
+    index = load_index(index_path)
+    jobs = {}
+    stale = []
+    for filename in file_list:
+        try:
+            stat = os.stat(logs_index.folder+'/'+filename)
+        except FileNotFoundError:
+            ui.textBrowser.append('no such folder' + filename)
+            continue
+        entry = index.get(filename)
+        if entry is None or entry.get('size') != stat.st_size or entry.get('mtime_ns') != stat.st_mtime_ns:
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'row': None}
+            stale.append(filename)
+        jobs[filename] = entry
+    timings = dict.fromkeys(STAGES, 0.0)
+
+    if recipe_cache is None:
+        recipe_cache = RecipeCache()
+    if workers is None:
+        workers = WORKERS
+    timings['index'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if workers > 1 and len(stale) > 1:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='collect')
+        results = executor.map(lambda filename: _parse_job_task(logs_index, te_index, filename, recipe_cache), stale)
+    else:
+        executor = None
+        results = (_parse_job_task(logs_index, te_index, filename, recipe_cache) for filename in stale)
+    try:
+        for filename, (row, job_timings, messages) in zip(stale, results):
+            jobs[filename]['row'] = row
+            for stage, seconds in job_timings.items():
+                timings[stage] += seconds
+            for text, replace in messages:
+                report(text, replace)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    timings['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rows = []
+    total_time = 0
+    for entry in jobs.values():
+        if entry['row'] is None:
+            continue
+        _, total_time = real_time_calculation(entry['row'], total_time)
+        rows.append(entry['row'])
+    # logs that are gone drop out of the index
+    save_index(index_path, jobs)
+    recipe_cache.save()
+    timings['index'] += time.perf_counter() - start
+    return rows, total_time, len(stale), len(file_list), timings
+
+
+def timing_breakdown(scan_time, timings, workers=None):
+    """
+    Describe where the collection time went, one line per stage.
+
+    Args:
+        scan_time (float): Seconds spent listing the folders.
+        timings (dict): The timings returned by collect_jobs.
+        workers (int): The number of workers collect_jobs ran with, WORKERS by default.
+
+    Returns:
+        str: The breakdown, the stages of the workers are summed over them and can add up
+        to more than the wall clock time of the parsing.
+    """
+    if workers is None:
+        workers = WORKERS
+    lines = ['collected with %d workers:' % workers,
+             '  scan folders %.3fs' % scan_time,
+             '  index %.3fs' % timings['index'],
+             '  parse %.3fs, summed over the workers:' % timings['parse']]
+    lines += ['    %s %.3fs' % (stage, timings[stage]) for stage in STAGES]
+    return '\n'.join(lines)
+
+
 def logic():
     '''main function to collect logs and create list of dictionaries , each dict represent print job.
 
@@ -341,62 +802,25 @@ def logic():
     '''
     ui.textBrowser.setPlainText('collecting logs . . . ')
     TELogs = 'C:/DragonFly/Logs/TimeEstimationLogs'
-    total_time = 0
     folder = 'C:/DragonFly/PrintLogs'
-    interested = ['File Name', 'Recipe', 'DragonflyPC', 'Initial Time Estimation', 'StartTime', 'End Time',  'Conductor Slice Thickness',
-                  'Insulator Slice Thickness', 'Tray Temp', 'Resolution', 'Insulator Slices', 'Conductor Slices', 'Total Slices', 'Percentage', 'Finish Status', 'Time spent']
-    file_list = get_logs_list(folder)
-    #
-    for filename in file_list:
-        log_dict = dict()
-        for key in interested:
-            log_dict[key] = ''
-        try:
-            with open(folder+'/'+filename) as f:
-                f = f.readlines()
-        except FileNotFoundError:
-            ui.textBrowser.append('no such folder' + filename)
-        ### add file name to dict ###
-        log_dict["File Name"] = filename[re.search(
-            '[a-zA-Z]+_* *[a-zA-Z]+|[a-zA-Z]+', filename).regs[0][0]:re.search('[a-zA-Z]+_* *[a-zA-Z]+|[a-zA-Z]+', filename).regs[0][1]]
-        ### get Time estimation file ###
-        time_estimation_file = get_te_file(TELogs, log_dict["File Name"])
-        if time_estimation_file:
-            log_dict['Initial Time Estimation'] = time_estimation_calc(
-                TELogs, time_estimation_file)
-        ### add Recipe name to Dict ###
-        log_older = get_folder_log_path(folder, log_dict["File Name"])
-        if not log_older:
-            continue
-        recipe = find_recipe(log_older)
-        if recipe:
-            log_dict['Recipe'] = recipe
-        else:
-            log_dict['Recipe'] = 'no pcbjc file'
-            ui.textBrowser.setPlainText('no pcbjc file')
-        ############## end #################
-        for line in f:
-            if line == "\n" or "-----" in line:
-                continue
-            key, value = line.split(':\t')
-            value = value.rstrip()
-            for inter in interested:
-                if inter in key:
-                    if not log_dict.get(key):
-                        log_dict[inter] = value
-        ############# add actual Printing time ############################
-
-        time_wasted, total_time = real_time_calculation(log_dict, total_time)
-        if not time_wasted:
-            continue
-        log_dict['Percentage'] = round(calculate_percentage(log_dict), 4)*100
-        log_dict['Time spent'] = str(time_wasted)
-        # point to add more calculations for logging
-        log.append(log_dict)
+    interested = INTERESTED
+    log.clear()
+    # every folder is listed once, lookups of the print jobs go through these indexes
+    start = time.perf_counter()
+    logs_index = FolderIndex(folder)
+    te_index = FolderIndex(TELogs)
+    scan_time = time.perf_counter() - start
+    recipe_cache = RecipeCache()
+    workers = WORKERS
+    rows, total_time, parsed, file_count, timings = collect_jobs(logs_index, te_index, workers=workers,
+                                                                 recipe_cache=recipe_cache)
+    log.extend(rows)
 
     ui.textBrowser.setPlainText(str(datetime.timedelta(seconds=total_time)))
 
     df = pd.DataFrame(data=log)
+    # the total row is a new row, the rows of the jobs are shared with the index
+    log_dict = dict()
     for key in interested:
         if key == 'Time spent':
             log_dict[key] = str(datetime.timedelta(seconds=total_time))
@@ -404,11 +828,14 @@ def logic():
         log_dict[key] = ''
     # last_row=[' ' for i in range(len(log_dict)-1)] + ['Total Working time'] + [str(datetime.timedelta(seconds=total_time))]
     df2 = pd.DataFrame(data=log_dict, index=[len(log)])
-    df = df.append(df2, ignore_index=True)
+    df = pd.concat([df, df2], ignore_index=True)
     create_output_folder('')
-    _, filename = save_file(log, 'C:/output/')
-    save_recipes(folder)
+    _, filename = save_file(df, 'C:/output/')
+    save_recipes(logs_index)
     ui.textBrowser.append('you run '+str(len(log))+' print jobs')
+    ui.textBrowser.append(str(parsed)+' new or changed logs parsed, '+str(file_count-parsed)+' taken from the index')
+    ui.textBrowser.append(str(recipe_cache.misses)+' archives read for their recipe, '+str(recipe_cache.hits)+' recipes taken from the cache')
+    ui.textBrowser.append(timing_breakdown(scan_time, timings, workers))
     ui.textBrowser.append(
         'the logs are collected correctly\nyou can find them in:\nc://output')
 
@@ -423,8 +850,15 @@ def finish():
 if __name__ == '__main__':
     log = []
 
+    # settings, the other arguments are left to Qt
+    parser = argparse.ArgumentParser(description='Collect the print job logs of the DF-IV printer.')
+    parser.add_argument('-j', '--workers', type=int, default=WORKERS,
+                        help=f'number of threads parsing logs (default: {WORKERS})')
+    args, qt_args = parser.parse_known_args()
+    WORKERS = max(1, args.workers)
+
     # create application
-    app = QtWidgets.QApplication(sys.argv)
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
     # create form and init UI
     MainWindow = QtWidgets.QMainWindow()
     ui = Ui_MainWindow()
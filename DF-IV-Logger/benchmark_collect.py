@@ -0,0 +1,162 @@
+# Imports
+import argparse
+import json
+import os
+import shutil
+import string
+import sys
+import tempfile
+import time
+import zipfile
+import Logger_mark_2
+
+
+class _ConsoleUi:
+    """
+    Stands in for the main window, so the collection messages go to the console.
+    """
+
+    class textBrowser:
+        @staticmethod
+        def append(text):
+            print(text)
+
+        @staticmethod
+        def setPlainText(text):
+            print(text)
+
+
+def job_name(number, underscored=False):
+    """
+    Name of a synthetic print job, all names have the same length so none contains another.
+
+    The names are letters only, or 'Job_' and letters when underscored, which the log
+    folder lookup never matches since it compares against names without underscores.
+    """
+    letters = ''
+    for _ in range(5):
+        number, digit = divmod(number, 26)
+        letters = string.ascii_lowercase[digit] + letters
+    return ('Job_' if underscored else 'Job') + letters
+
+
+def make_history(root, count):
+    """
+    Write a synthetic printer history of count print jobs under root.
+
+    Every job gets a .log file and a job folder in PrintLogs and a PrintSeq file in
+    TimeEstimationLogs. Half of the job folders hold a Recipe folder, the other half a
+    .pcbjc archive the recipe is read from. One job in ten has only its .log file, and
+    one in ten has an underscored name, so the lookups that miss are timed too.
+
+    Args:
+        root (str): The folder standing in for C:/DragonFly.
+        count (int): Number of print jobs.
+
+    Returns:
+        tuple: (PrintLogs folder, TimeEstimationLogs folder).
+    """
+    folder = os.path.join(root, 'PrintLogs')
+    TELogs = os.path.join(root, 'Logs', 'TimeEstimationLogs')
+    os.makedirs(folder)
+    os.makedirs(TELogs)
+    for number in range(count):
+        name = job_name(number, underscored=number % 10 == 7)
+        day = number % 28 + 1
+        stamp = '2023-05-%02d__10-00-00' % day
+        with open(os.path.join(folder, name + '_' + stamp + '.log'), 'w') as f:
+            f.write('--------\n'
+                    'StartTime:\t' + stamp + '\n'
+                    'End Time:\t2023-05-%02d__12-30-%02d\n' % (day, number % 60) +
+                    'DragonflyPC:\tDF-IV\n'
+                    'Conductor Slices:\t120\n'
+                    'Insulator Slices:\t\n'
+                    'Total Slices:\t200\n'
+                    'Finish Status:\tFinished\n')
+        if number % 10 == 3:
+            continue
+        job_folder = os.path.join(folder, name + '_' + stamp)
+        os.makedirs(job_folder)
+        if number % 2:
+            os.makedirs(os.path.join(job_folder, 'Recipe', 'Recipe%d' % (number % 7)))
+        else:
+            with zipfile.ZipFile(os.path.join(job_folder, name + '.pcbjc'), 'w') as archive:
+                archive.writestr('pcbj.info', json.dumps({'Recipe': 'Recipe%d' % (number % 7), 'Layers': []}))
+        with open(os.path.join(TELogs, name + '_PrintSeq.log'), 'w') as f:
+            f.write('2023-05-%02d 09:00:00 start\n' % day)
+            f.writelines('2023-05-%02d 09:%02d:00 layer\n' % (day, minute) for minute in range(60))
+            f.write('2023-05-%02d 11:00:00 end\n' % day)
+    return folder, TELogs
+
+
+def benchmark(counts, root, workers=None):
+    """
+    Time the collection of synthetic histories of each size, cold and with the index of the previous run.
+
+    Args:
+        counts (list): Numbers of print jobs.
+        root (str): Scratch folder the histories are written to.
+        workers (int): Number of threads parsing logs, Logger_mark_2.WORKERS by default.
+
+    Returns:
+        list: (jobs, folder scan seconds, cold collection seconds, warm collection seconds) for each count.
+    """
+    Logger_mark_2.ui = _ConsoleUi()
+    results = []
+    for count in counts:
+        history = os.path.join(root, str(count))
+        shutil.rmtree(history, ignore_errors=True)
+        folder, TELogs = make_history(history, count)
+        index_path = os.path.join(history, 'index.json')
+
+        start = time.perf_counter()
+        logs_index = Logger_mark_2.FolderIndex(folder)
+        te_index = Logger_mark_2.FolderIndex(TELogs)
+        scan = time.perf_counter() - start
+        start = time.perf_counter()
+        recipe_cache = Logger_mark_2.RecipeCache(os.path.join(history, 'recipes.json'))
+        rows, _, _, _, timings = Logger_mark_2.collect_jobs(logs_index, te_index, index_path, workers, recipe_cache)
+        cold = time.perf_counter() - start
+        if len(rows) != count:
+            raise RuntimeError('%d of %d jobs collected' % (len(rows), count))
+        start = time.perf_counter()
+        recipe_cache = Logger_mark_2.RecipeCache(os.path.join(history, 'recipes.json'))
+        Logger_mark_2.collect_jobs(Logger_mark_2.FolderIndex(folder), Logger_mark_2.FolderIndex(TELogs), index_path,
+                                   workers, recipe_cache)
+        warm = time.perf_counter() - start
+        results.append((count, scan, cold, warm))
+        print(f'{count:>8}{scan:>10.3f}{cold:>10.3f}{warm:>10.3f}{cold / count * 1000:>12.3f}')
+        print(Logger_mark_2.timing_breakdown(scan, timings, workers))
+        shutil.rmtree(history, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    """
+    Command line entry point of the collection benchmark.
+
+    Args:
+        argv (list): The command line arguments, sys.argv[1:] by default.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description='Time the print log collection on synthetic histories of growing size.')
+    parser.add_argument('counts', nargs='*', type=int, default=[100, 1000, 5000, 20000],
+                        help='numbers of print jobs (default: 100 1000 5000 20000)')
+    parser.add_argument('-j', '--workers', type=int, default=Logger_mark_2.WORKERS,
+                        help=f'number of threads parsing logs (default: {Logger_mark_2.WORKERS})')
+    parser.add_argument('--folder', default=None, help='scratch folder for the histories (default: a temporary folder)')
+    args = parser.parse_args(argv)
+    root = args.folder or tempfile.mkdtemp(prefix='DF-IV-Logger-benchmark-')
+    print(f"{'jobs':>8}{'scan s':>10}{'cold s':>10}{'warm s':>10}{'cold ms/job':>12}")
+    try:
+        benchmark(args.counts, root, args.workers)
+    finally:
+        if args.folder is None:
+            shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import collections
+import math
+import threading
+import numpy as np
+from scipy import ndimage
+from scipy.spatial import cKDTree
+
+
+BLOB = 0
+PAD = 1
+CORNER = 2
+
+
+class FeatureSet:
+    """
+    Features detected in one layer, with a KD-tree over their positions.
+
+    Attributes:
+        points (numpy.ndarray): (n, 2) float array of (x, y) scene positions.
+        kinds (numpy.ndarray): BLOB, PAD or CORNER for each point.
+        sizes (numpy.ndarray): Area in pixels of the blob or pad, 0 for corners.
+        tree (cKDTree): KD-tree over points.
+    """
+
+    def __init__(self, points, kinds, sizes):
+        self.points = points
+        self.kinds = kinds
+        self.sizes = sizes
+        self.tree = cKDTree(points) if len(points) else None
+
+    def __len__(self):
+        return len(self.points)
+
+
+class FeatureCache:
+    """
+    LRU cache of FeatureSets keyed like the layer cache, so an archive is only scanned once.
+    """
+
+    def __init__(self, max_entries=32):
+        """
+        Args:
+            max_entries (int): Number of feature sets kept.
+        """
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """
+        Return the cached feature set of a layer, building it on a miss.
+
+        Args:
+            key (tuple): The layer key, see LayerCache.key.
+            build (callable): Returns the FeatureSet of the layer, called without the lock held.
+
+        Returns:
+            FeatureSet: The features of the layer.
+        """
+        with self._lock:
+            features = self._entries.get(key)
+            if features is not None:
+                self._entries.move_to_end(key)
+                return features
+        features = build()
+        with self._lock:
+            self._entries[key] = features
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return features
+
+
+def detect_features(codes, blob_max_area=400, pad_max_area=40000, pad_min_fill=0.5, corner_spacing=64):
+    """
+    Detect blobs, pads and corners in a layer.
+
+    Connected components up to blob_max_area pixels are blobs and compact components
+    up to pad_max_area pixels are pads, both located by their centroid. Corners are the
+    pixel corners where one or three of the four surrounding pixels print, thinned to at
+    most one per corner_spacing x corner_spacing cell.
+
+    Args:
+        codes (numpy.ndarray): uint8 layer codes as returned by imaging.layer_codes.
+        blob_max_area (int): Largest blob in pixels.
+        pad_max_area (int): Largest pad in pixels.
+        pad_min_fill (float): Smallest part of its bounding box a pad covers.
+        corner_spacing (int): Cell size of the corner thinning in pixels.
+
+    Returns:
+        FeatureSet: The features of the layer.
+    """
+    mask = codes != 0
+    labels, count = ndimage.label(mask)
+    points, kinds, sizes = [np.empty((0, 2))], [np.empty(0, dtype=np.uint8)], [np.empty(0)]
+    if count:
+        areas = np.bincount(labels.ravel(), minlength=count + 1)[1:]
+        objects = ndimage.find_objects(labels)
+        boxes = np.array([(box[0].stop - box[0].start) * (box[1].stop - box[1].start) for box in objects])
+        blob = areas <= blob_max_area
+        pad = ~blob & (areas <= pad_max_area) & (areas >= pad_min_fill * boxes)
+        selected = np.flatnonzero(blob | pad)
+        if len(selected):
+            # coordinate sums of every component in one pass over the printed pixels
+            printed = np.flatnonzero(labels)
+            component = labels.ravel()[printed]
+            y, x = np.divmod(printed, labels.shape[1])
+            sum_x = np.bincount(component, weights=x, minlength=count + 1)[selected + 1]
+            sum_y = np.bincount(component, weights=y, minlength=count + 1)[selected + 1]
+            points.append(np.column_stack((sum_x, sum_y)) / areas[selected, None] + 0.5)
+            kinds.append(np.where(blob[selected], BLOB, PAD).astype(np.uint8))
+            sizes.append(areas[selected].astype(float))
+
+    window = mask[:-1, :-1].view(np.uint8) + mask[:-1, 1:] + mask[1:, :-1] + mask[1:, 1:]
+    rows, columns = np.nonzero((window == 1) | (window == 3))
+    if len(rows):
+        cells = (rows // corner_spacing) * (mask.shape[1] // corner_spacing + 1) + columns // corner_spacing
+        _, first = np.unique(cells, return_index=True)
+        points.append(np.column_stack((columns[first] + 1, rows[first] + 1)).astype(float))
+        kinds.append(np.full(len(first), CORNER, dtype=np.uint8))
+        sizes.append(np.zeros(len(first)))
+    return FeatureSet(np.concatenate(points), np.concatenate(kinds), np.concatenate(sizes))
+
+
+def rigid_transform(source, target):
+    """
+    Least squares rotation and translation mapping source points onto target points (Kabsch).
+
+    Args:
+        source (numpy.ndarray): (n, 2) points.
+        target (numpy.ndarray): (n, 2) matching points.
+
+    Returns:
+        tuple: (rotation, translation), a 2x2 matrix and a 2 vector with target = source @ rotation.T + translation.
+    """
+    source_center, target_center = source.mean(axis=0), target.mean(axis=0)
+    covariance = (source - source_center).T @ (target - target_center)
+    u, _, vt = np.linalg.svd(covariance)
+    rotation = vt.T @ u.T
+    if np.linalg.det(rotation) < 0:
+        vt[-1] *= -1
+        rotation = vt.T @ u.T
+    return rotation, target_center - source_center @ rotation.T
+
+
+def _similar(features, kind, size, tolerance):
+    """
+    Indices of the features of a kind whose size is within a relative tolerance.
+    """
+    candidates = features.kinds == kind
+    if kind != CORNER:
+        candidates &= np.abs(features.sizes - size) <= tolerance * size
+    return np.flatnonzero(candidates)
+
+
+def _inliers(base, points, distance):
+    distances, indices = base.tree.query(points, distance_upper_bound=distance)
+    found = np.isfinite(distances)
+    return found, indices
+
+
+def match_features(base, top, distance=2.0, size_tolerance=0.15, hypotheses=300, candidates=4,
+                   check_points=300, min_spacing=50, iterations=5, seed=0):
+    """
+    Find the rigid transform that maps the top layer features onto the base layer features.
+
+    Pairs of top blobs or pads are matched to base pairs of the same kind, similar size
+    and the same spacing, found through the base KD-tree. Each candidate transform is
+    scored on a sample of top features and the best one is refined on all of its inliers.
+
+    Args:
+        base (FeatureSet): Features of the base job's last layer.
+        top (FeatureSet): Features of the top job's first layer.
+        distance (float): Largest distance in pixels between matching features.
+        size_tolerance (float): Largest relative size difference of matching blobs and pads.
+        hypotheses (int): Number of top pairs tried.
+        candidates (int): Base candidates tried for each feature of a top pair.
+        check_points (int): Number of top features used to score a candidate transform.
+        min_spacing (float): Smallest distance between the two features of a pair.
+        iterations (int): Refinement rounds on the inliers.
+        seed (int): Seed of the random pair selection, so results are repeatable.
+
+    Returns:
+        tuple: (dx, dy, angle, confidence). (dx, dy) is where the top left corner of the
+        top layer lands, angle is the rotation in degrees and confidence is the part of the
+        top features with a matching base feature, from 0 to 1. None if no transform was found.
+    """
+    if len(base) < 2 or len(top) < 2:
+        return None
+    rng = np.random.default_rng(seed)
+    anchors = np.flatnonzero(top.kinds != CORNER)
+    if len(anchors) < 2:
+        anchors = np.arange(len(top))
+    sample = top.points[rng.choice(len(top), min(check_points, len(top)), replace=False)]
+
+    best_score, best = 0, None
+    for _ in range(hypotheses):
+        first, second = rng.choice(anchors, 2, replace=False)
+        spacing = np.linalg.norm(top.points[second] - top.points[first])
+        if spacing < min_spacing:
+            continue
+        matches = _similar(base, top.kinds[first], top.sizes[first], size_tolerance)
+        for base_first in rng.choice(matches, min(candidates, len(matches)), replace=False):
+            ring = np.array(base.tree.query_ball_point(base.points[base_first], spacing + distance), dtype=int)
+            if not len(ring):
+                continue
+            ring = ring[np.abs(np.linalg.norm(base.points[ring] - base.points[base_first], axis=1) - spacing) <= distance]
+            ring = np.intersect1d(ring, _similar(base, top.kinds[second], top.sizes[second], size_tolerance))
+            for base_second in ring[:candidates]:
+                rotation, translation = rigid_transform(top.points[[first, second]], base.points[[base_first, base_second]])
+                found, _ = _inliers(base, sample @ rotation.T + translation, distance)
+                score = np.count_nonzero(found)
+                if score > best_score:
+                    best_score, best = score, (rotation, translation)
+    if best is None:
+        return None
+
+    rotation, translation = best
+    for _ in range(iterations):
+        found, indices = _inliers(base, top.points @ rotation.T + translation, distance)
+        if np.count_nonzero(found) < 2:
+            break
+        rotation, translation = rigid_transform(top.points[found], base.points[indices[found]])
+    found, _ = _inliers(base, top.points @ rotation.T + translation, distance)
+    angle = math.degrees(math.atan2(rotation[1, 0], rotation[0, 0]))
+    return float(translation[0]), float(translation[1]), angle, np.count_nonzero(found) / len(top)
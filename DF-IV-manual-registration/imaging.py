@@ -0,0 +1,435 @@
+from PyQt5 import QtCore, QtGui, sip
+import functools
+import struct
+import numpy as np
+
+
+# pen colors of the layer overlay and the alpha used for each state
+CI_COLOR = (0, 255, 0)
+DI_COLOR = (255, 255, 0)
+_OVERLAY_ALPHA = {1: 255, 0: 120}
+# BITMAPFILEHEADER.bfOffBits followed by the BITMAPINFOHEADER, read from offset 10
+_BMP_HEADER = struct.Struct('<2L2l2H2L2lL')
+
+
+class _ImageMemory:
+    """
+    Exposes the memory of a QImage to NumPy, the arrays built on it keep the image alive.
+    """
+
+    def __init__(self, image, writable):
+        # QImage.bits() detaches the image first, so other images sharing the data are not affected
+        ptr = image.bits() if writable else image.constBits()
+        self.image = image
+        self.__array_interface__ = {
+            'version': 3,
+            'shape': (image.height(), image.bytesPerLine()),
+            'typestr': '|u1',
+            'data': (int(ptr), not writable),
+        }
+
+
+def qimage_to_array(image, writable=False):
+    """
+    View the pixels of a QImage as a NumPy array, without copying them.
+
+    The view skips the padding at the end of the scan lines. 8 bit images give one uint8
+    per pixel, 32 bit images one uint32 per pixel as Qt stores it (0xAARRGGBB), other
+    depths give the raw scan lines, padding included. The array keeps the image alive.
+
+    Args:
+        image (QImage): The image to view.
+        writable (bool): Return a writable view, writing through it changes the image in place.
+
+    Returns:
+        numpy.ndarray: Array of shape (height, width), or (height, bytesPerLine) for the raw scan lines.
+    """
+    if image.isNull():
+        return np.empty((0, 0), dtype=np.uint8)
+    rows = np.asarray(_ImageMemory(image, writable))
+    if image.depth() == 8:
+        return rows[:, :image.width()]
+    if image.depth() == 32:
+        return rows.view(np.uint32)[:, :image.width()]
+    return rows
+
+
+def array_to_qimage(array, fmt, color_table=None):
+    """
+    Wrap a 2D NumPy array as a QImage, without copying it.
+
+    The array is attached to the image as image.ndarray, so it lives as long as the image
+    does. Writing to the array changes the image.
+
+    Args:
+        array (numpy.ndarray): uint8 pixels for 8 bit formats, uint32 pixels for 32 bit
+            formats. Its pixels must be contiguous and its rows 4 byte aligned.
+        fmt (QImage.Format): The pixel format of the image.
+        color_table (list): Color table of indexed images.
+
+    Returns:
+        QImage: An image sharing memory with the array.
+
+    Raises:
+        ValueError: If the array cannot back a QImage of that format as it is.
+    """
+    if array.ndim != 2 or array.strides[1] != array.itemsize or array.strides[0] % 4 \
+            or QtGui.QImage.toPixelFormat(fmt).bitsPerPixel() != array.itemsize * 8:
+        raise ValueError('a %s array with strides %s cannot back a QImage of format %s'
+                         % (array.dtype, array.strides, fmt))
+    height, width = array.shape
+    image = QtGui.QImage(sip.voidptr(array.ctypes.data), width, height, array.strides[0], fmt)
+    if color_table is not None:
+        image.setColorTable(color_table)
+    image.ndarray = array
+    return image
+
+
+def separation_mask(image):
+    """
+    Decode a separation image into a uint8 array where every non-black pixel is 1.
+
+    A pixel counts as "on" when any of its red, green or blue components is above zero,
+    the same test the per-pixel combine_images used to do.
+
+    Args:
+        image (QImage): The separation bitmap as read from the pcbjc file.
+
+    Returns:
+        numpy.ndarray: Array of shape (height, width) and dtype uint8 holding 0 or 1.
+    """
+    width, height = image.width(), image.height()
+    if image.isNull():
+        return np.zeros((height, width), dtype=np.uint8)
+
+    fmt = image.format()
+    if fmt in (QtGui.QImage.Format_Mono, QtGui.QImage.Format_MonoLSB):
+        lut = [(rgb & 0xFFFFFF) != 0 for rgb in image.colorTable()] + [False, False]
+        if lut[0] == lut[1]:
+            return np.full((height, width), lut[0], dtype=np.uint8)
+        bitorder = 'big' if fmt == QtGui.QImage.Format_Mono else 'little'
+        mask = np.unpackbits(qimage_to_array(image), axis=1, count=width, bitorder=bitorder)
+        if lut[0]:
+            mask ^= 1
+        return mask
+
+    if fmt == QtGui.QImage.Format_Indexed8:
+        lut = np.array([(rgb & 0xFFFFFF) != 0 for rgb in image.colorTable()] or [False], dtype=np.uint8)
+        indices = qimage_to_array(image)
+        return np.take(lut, indices, mode='clip')
+
+    if fmt == QtGui.QImage.Format_Grayscale8:
+        return (qimage_to_array(image) != 0).view(np.uint8)
+
+    if fmt not in (QtGui.QImage.Format_RGB32, QtGui.QImage.Format_ARGB32,
+                   QtGui.QImage.Format_ARGB32_Premultiplied):
+        image = image.convertToFormat(QtGui.QImage.Format_ARGB32)
+    pixels = qimage_to_array(image)
+    return ((pixels & 0x00FFFFFF) != 0).view(np.uint8)
+
+
+def _bmp_header(data):
+    """
+    Parse the header of an uncompressed BMP, see bmp_mask.
+
+    Returns:
+        tuple: (pixel data offset, DIB header size, width, height, bits per pixel, palette
+        colors), None if the data is not a bitmap bmp_mask can decode.
+    """
+    if len(data) < 10 + _BMP_HEADER.size or data[0] != 0x42 or data[1] != 0x4D:
+        return None
+    offset, header_size, width, height, _, bits, compression, _, _, _, colors = _BMP_HEADER.unpack_from(data, 10)
+    if header_size < 40 or compression != 0 or bits not in (1, 4, 8, 24, 32) or width <= 0 or height == 0:
+        return None
+    stride = (width * bits + 31) // 32 * 4
+    if offset + stride * abs(height) > len(data):
+        return None
+    return offset, header_size, width, height, bits, colors
+
+
+def bmp_size(data):
+    """
+    Read the size of a BMP that bmp_mask can decode from its header.
+
+    Returns:
+        tuple: (width, height) in pixels, None if bmp_mask cannot decode the data.
+    """
+    header = _bmp_header(np.frombuffer(data, dtype=np.uint8))
+    if header is None:
+        return None
+    return header[2], abs(header[3])
+
+
+def bmp_mask(data, step=1):
+    """
+    Decode an uncompressed BMP separation straight from its bytes, without a QImage.
+
+    Only the 1, 4, 8, 24 and 32 bit BI_RGB bitmaps the RIPs write are handled, a pixel is
+    "on" under the same test as separation_mask. With a step above 1 only every step-th
+    row and column is decoded, starting at the top left pixel, which costs a small part
+    of a full decode.
+
+    Args:
+        data (memoryview): The content of the BMP file, or any other object with the buffer protocol.
+        step (int): Sampling step in pixels.
+
+    Returns:
+        numpy.ndarray: Array of shape (ceil(height / step), ceil(width / step)) and dtype
+        uint8 holding 0 or 1, None if the data is not a bitmap this function can decode.
+        It never shares memory with data.
+    """
+    data = np.frombuffer(data, dtype=np.uint8)
+    header = _bmp_header(data)
+    if header is None:
+        return None
+    offset, header_size, width, height, bits, colors = header
+    rows = abs(height)
+    stride = (width * bits + 31) // 32 * 4
+    pixels = data[offset:offset + stride * rows].reshape(rows, stride)
+    if height > 0:
+        # bottom-up rows
+        pixels = pixels[::-1]
+    pixels = pixels[::step]
+    rows = len(pixels)
+
+    if bits == 24 or bits == 32:
+        channels = bits // 8
+        return pixels[:, :width * channels].reshape(rows, width, channels)[:, ::step, :3].any(axis=2).view(np.uint8)
+
+    colors = colors or 1 << bits
+    palette_start = 14 + header_size
+    if palette_start + 4 * colors > offset:
+        return None
+    lut = data[palette_start:palette_start + 4 * colors].reshape(colors, 4)[:, :3].any(axis=1).view(np.uint8)
+    if bits == 1:
+        pixels = np.unpackbits(pixels, axis=1, count=width)
+    elif bits == 4:
+        pixels = np.stack((pixels >> 4, pixels & 0x0F), axis=2).reshape(rows, 2 * stride)
+    return np.take(lut, pixels[:, :width:step], mode='clip')
+
+
+def _stored_pixel(color, fmt):
+    """
+    Return the raw 32 bit value Qt stores for the given color in an image of format fmt.
+    """
+    sample = QtGui.QImage(1, 1, fmt)
+    sample.setPixelColor(0, 0, color)
+    return qimage_to_array(sample)[0, 0]
+
+
+def recolor_white(image, new_color):
+    """
+    Change all white pixels in the given image to the specified color, in place.
+
+    For RGB32 and ARGB32 images the pixels are replaced through a NumPy view of the
+    image memory. Indexed and monochrome images are recolored by rewriting the white
+    entries of their color table. A translucent color on an RGB32 image, or any other
+    pixel format, is handled on an ARGB32 copy, which is then returned.
+
+    Args:
+        image (QImage): The image to modify.
+        new_color (QColor): The new color to use for white pixels, alpha included.
+
+    Returns:
+        QImage: The modified image.
+    """
+    new_color = QtGui.QColor(new_color)
+    fmt = image.format()
+    if fmt in (QtGui.QImage.Format_Mono, QtGui.QImage.Format_MonoLSB, QtGui.QImage.Format_Indexed8):
+        image.setColorTable([new_color.rgba() if (rgb & 0xFFFFFF) == 0xFFFFFF else rgb
+                             for rgb in image.colorTable()])
+        return image
+
+    if fmt not in (QtGui.QImage.Format_RGB32, QtGui.QImage.Format_ARGB32,
+                   QtGui.QImage.Format_ARGB32_Premultiplied) or \
+            (fmt == QtGui.QImage.Format_RGB32 and new_color.alpha() < 255):
+        image = image.convertToFormat(QtGui.QImage.Format_ARGB32)
+        fmt = QtGui.QImage.Format_ARGB32
+
+    # QImage.pixel() hands back the stored value, premultiplied or not, and the old
+    # QColor comparison ignored alpha, so only the color bits decide what is white
+    pixels = qimage_to_array(image, writable=True)
+    pixels[(pixels & 0xFFFFFF) == 0xFFFFFF] = _stored_pixel(new_color, fmt)
+    return image
+
+
+@functools.lru_cache(maxsize=None)
+def _overlay_palette(state):
+    """
+    Build the four possible output colors of the overlay for the given state.
+
+    The colors are produced by letting QPainter draw the same points the per-pixel
+    implementation used to draw, so the result matches Qt's own blending exactly.
+
+    Args:
+        state (int): The state value (1 or 0) used for color coding.
+
+    Returns:
+        numpy.ndarray: uint32 RGB32 values indexed by (CI on) | (DI on) << 1.
+    """
+    alpha = _OVERLAY_ALPHA.get(state, _OVERLAY_ALPHA[0])
+    sample = QtGui.QImage(4, 1, QtGui.QImage.Format_RGB32)
+    sample.fill(QtGui.QColor(0, 0, 0))
+    painter = QtGui.QPainter(sample)
+    painter.setPen(QtGui.QColor(*CI_COLOR, alpha))
+    painter.drawPoint(1, 0)
+    painter.drawPoint(3, 0)
+    painter.setPen(QtGui.QColor(*DI_COLOR, alpha))
+    painter.drawPoint(2, 0)
+    painter.drawPoint(3, 0)
+    painter.end()
+    return np.array([sample.pixel(x, 0) for x in range(4)], dtype=np.uint32)
+
+
+def _fit_mask(mask, height, width):
+    """
+    Crop or zero-pad a mask so it matches the given size, anchored at the top left corner.
+    """
+    if mask.shape == (height, width):
+        return mask
+    fitted = np.zeros((height, width), dtype=np.uint8)
+    h, w = min(height, mask.shape[0]), min(width, mask.shape[1])
+    fitted[:h, :w] = mask[:h, :w]
+    return fitted
+
+
+def layer_codes(ci_mask, di_mask):
+    """
+    Merge the CI and DI masks of a layer into one code per pixel.
+
+    Bit 0 of a code is set where the CI separation prints, bit 1 where the DI separation
+    prints, so the codes can be used directly as indices into an overlay palette.
+
+    Args:
+        ci_mask (numpy.ndarray): uint8 mask of the conductive ink separation.
+        di_mask (numpy.ndarray): uint8 mask of the dielectric ink separation,
+            cropped or padded to the size of ci_mask.
+
+    Returns:
+        numpy.ndarray: uint8 array (height x width) with values 0 to 3. Its rows are
+        padded to a multiple of 4 bytes so it can back a QImage directly.
+    """
+    height, width = ci_mask.shape
+    di_mask = _fit_mask(di_mask, height, width)
+    codes = np.zeros((height, (width + 3) & ~3), dtype=np.uint8)[:, :width]
+    np.not_equal(di_mask, 0, out=codes.view(bool))
+    codes <<= 1
+    codes |= ci_mask != 0
+    return codes
+
+
+def downsample_codes(codes, step):
+    """
+    Shrink layer codes by an integer factor, keeping every code bit set in a block.
+
+    Pixels of a step x step block are OR-ed together, so thin traces stay visible at low
+    resolution. Blocks cut by the right and bottom edges are kept.
+
+    Args:
+        codes (numpy.ndarray): uint8 layer codes as returned by layer_codes.
+        step (int): The reduction factor.
+
+    Returns:
+        numpy.ndarray: uint8 codes of shape (ceil(height / step), ceil(width / step)),
+        rows padded like layer_codes.
+    """
+    height, width = codes.shape
+    small_height, small_width = -(-height // step), -(-width // step)
+    small = np.zeros((small_height, (small_width + 3) & ~3), dtype=np.uint8)[:, :small_width]
+    full_height, full_width = height // step, width // step
+    if full_height and full_width:
+        blocks = codes[:full_height * step, :full_width * step].reshape(full_height, step, full_width, step)
+        small[:full_height, :full_width] = np.bitwise_or.reduce(np.bitwise_or.reduce(blocks, axis=3), axis=1)
+    if full_width < small_width:
+        edge = codes[:, full_width * step:]
+        small[:, full_width] = np.bitwise_or.reduceat(np.bitwise_or.reduce(edge, axis=1), np.arange(0, height, step))
+    if full_height < small_height:
+        edge = codes[full_height * step:, :]
+        small[full_height, :] = np.bitwise_or.reduceat(np.bitwise_or.reduce(edge, axis=0), np.arange(0, width, step))
+    return small
+
+
+def codes_to_qimage(codes, state=1):
+    """
+    Wrap an array of layer codes as an indexed QImage without copying the pixel data.
+
+    The overlay colors live in the color table, so every pixel of the image has the
+    exact value the per-pixel painter used to produce. The array is attached to the
+    image so it lives as long as the image does.
+
+    Args:
+        codes (numpy.ndarray): uint8 layer codes as returned by layer_codes.
+        state (int): The state value (1 or 0) to use for color coding.
+
+    Returns:
+        QImage: An Indexed8 image sharing memory with the array.
+    """
+    return array_to_qimage(codes, QtGui.QImage.Format_Indexed8, [int(rgb) for rgb in _overlay_palette(state)])
+
+
+def composite_layer(ci_image, di_image, state=1):
+    """
+    Combine the CI and DI separations of a layer into one color coded image.
+
+    CI pixels are drawn green, DI pixels yellow on top of them, over a black background.
+
+    Args:
+        ci_image (QImage): The conductive ink separation.
+        di_image (QImage): The dielectric ink separation.
+        state (int): The state value (1 or 0) to use for color coding.
+
+    Returns:
+        QImage: The combined image, sized like ci_image.
+    """
+    codes = layer_codes(separation_mask(ci_image), separation_mask(di_image))
+    return codes_to_qimage(codes, state)
+
+
+def find_drops(codes, bit, left, top, right, bottom):
+    """
+    Find the drop positions of one separation inside a window of the layer codes.
+
+    A drop is placed at the center of every 2x2 block of pixels that all print, the
+    window is cropped from the codes before searching, so the cost depends on the size
+    of the window and not on the size of the layer.
+
+    Args:
+        codes (numpy.ndarray): uint8 layer codes as returned by layer_codes.
+        bit (int): 1 for the CI separation, 2 for the DI separation.
+        left (int): First column of the window.
+        top (int): First row of the window.
+        right (int): Last column of the window, included.
+        bottom (int): Last row of the window, included.
+
+    Returns:
+        numpy.ndarray: float array of shape (n, 2) with the (x, y) scene positions of the drops.
+    """
+    height, width = codes.shape
+    left, top = max(left, 0), max(top, 0)
+    window = codes[top:min(bottom, height - 1) + 1, left:min(right, width - 1) + 1] & bit
+    if window.shape[0] < 2 or window.shape[1] < 2:
+        return np.empty((0, 2))
+    full = (window[:-1, :-1] != 0) & (window[:-1, 1:] != 0) & (window[1:, :-1] != 0) & (window[1:, 1:] != 0)
+    rows, columns = np.nonzero(full)
+    # the block starting at (row, column) is centered on the pixel corner one pixel further
+    return np.column_stack((columns + left + 1, rows + top + 1)).astype(float)
+
+
+def array_to_polygon(points):
+    """
+    Copy an array of points into a QPolygonF in one step, without a Python loop.
+
+    Args:
+        points (numpy.ndarray): Array of shape (n, 2) with the (x, y) coordinates.
+
+    Returns:
+        QPolygonF: A polygon with the n points.
+    """
+    polygon = QtGui.QPolygonF()
+    polygon.fill(QtCore.QPointF(), len(points))
+    if len(points):
+        # QPointF is a pair of doubles, so the polygon's buffer is an (n, 2) float64 array
+        buffer = polygon.data()
+        buffer.setsize(len(points) * 2 * np.dtype(np.float64).itemsize)
+        np.frombuffer(buffer, np.float64).reshape(-1, 2)[:] = points
+    return polygon
@@ -0,0 +1,423 @@
+import os
+import sys
+import contextlib
+import zipfile
+import concurrent.futures
+import numpy as np
+from PyQt5 import QtGui
+from imaging import (composite_layer, recolor_white, codes_to_qimage, layer_codes, separation_mask, bmp_mask,
+                     bmp_size)
+from layer_cache import LayerCache
+from features import FeatureCache, detect_features
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from pcbjc import PcbjcArchive
+
+# composited layers kept between loads, in memory only unless LAYER_CACHE_DIR names a folder
+# for the optional on-disk cache, which is then kept below LAYER_CACHE_DISK_MB
+LAYER_CACHE_MB = 1024
+LAYER_CACHE_DIR = None
+LAYER_CACHE_DISK_MB = 2048
+LAYER_CACHE = LayerCache(LAYER_CACHE_MB, LAYER_CACHE_DIR, LAYER_CACHE_DISK_MB)
+# the DI separation of a layer is decoded here while the loading thread decodes the CI one,
+# inflating and image decoding release the GIL
+SEPARATION_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                                        thread_name_prefix='separation')
+FEATURE_CACHE = FeatureCache()
+
+
+class ZipFileReader:
+    def __init__(self,file_path):
+        """
+        Initialize a ZipFileReader instance.
+
+        Args:
+            file_path (str): The path to the ZIP file to read.
+        """
+        self.file_path = file_path
+        self.zip_file = None
+        self.info_dict = None
+        self.start_pos = 0.0
+        self.end_pos = 0.0
+        self.layer_index = None
+        self._z_offsets = None
+        # edits made inside a transaction only mark the reader dirty, commit writes them once
+        self.dirty = False
+        self._transaction_depth = 0
+        # I/O counters: archive rewrites and bytes written by them
+        self.saves = 0
+        self.bytes_written = 0
+        self.archive = PcbjcArchive(self.file_path)
+        self.zip_file = self.archive.zip_file
+        self.info_dict = self.archive.info
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Clean up resources associated with the ZipFileReader instance.
+
+        Pending edits are written first, unless the block raised.
+        """
+        try:
+            if exc_type is None:
+                self.commit()
+        finally:
+            self.archive.close()
+            self.zip_file = None
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Group edits so the archive is written once, when the outermost transaction ends.
+
+        If the block raises, the edits are dropped and pcbj.info is read again from the archive.
+
+        Example:
+            with reader.transaction():
+                reader.update_start_pos(x, y)
+                reader.update_z_start_pos(z)
+        """
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.rollback()
+            raise
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            self.commit()
+
+    def commit(self):
+        """
+        Write the pending edits, if there are any.
+
+        Returns:
+            int: The number of bytes written, 0 if nothing was pending.
+        """
+        if not self.dirty:
+            return 0
+        # Only pcbj.info is rewritten, the layer bitmaps are copied as they are
+        written = self.archive.save_info()
+        self.zip_file = self.archive.zip_file
+        self.dirty = False
+        self.saves += 1
+        self.bytes_written += written
+        return written
+
+    def rollback(self):
+        """
+        Drop the pending edits and read pcbj.info from the archive again.
+        """
+        self.info_dict = self.archive.reload_info()
+        self._z_offsets = None
+        self.dirty = False
+
+    def change_white_pixels(self, image, new_color):
+        """
+        Change all white pixels in the given image to the specified color.
+
+        Args:
+            image (QImage): The image to modify, RGB32, ARGB32, indexed or mono.
+            new_color (QColor): The new color to use for white pixels, alpha included.
+
+        Returns:
+            QImage: The modified image. Formats that cannot hold the new color are
+            returned as an ARGB32 copy.
+        """
+        return recolor_white(image, new_color)
+
+    def layer_thicknesses(self):
+        """
+        Get the thickness of each layer, from the CI separation or from the DI separation for DI only layers.
+
+        Returns:
+            numpy.ndarray: The thickness of each layer in microns.
+        """
+        return np.array([layer["Separations"][0]["LayerThicknessUM"] if layer["Separations"][0]['File']
+                         else layer["Separations"][1]["LayerThicknessUM"]
+                         for layer in self.info_dict["Layers"]])
+
+    def z_offsets(self):
+        """
+        Get the cumulative layer thickness, computed once per archive.
+
+        Returns:
+            numpy.ndarray: layer_count + 1 values, entry k is the height of the layers below layer k.
+        """
+        if self._z_offsets is None:
+            self._z_offsets = np.concatenate(([0], np.cumsum(self.layer_thicknesses())))
+        return self._z_offsets
+
+    def z_at_layer(self, layer_index, starting_z_position=None):
+        """
+        Get the Z start position of a layer.
+
+        Args:
+            layer_index (int): The index of the layer, layer_count gives the top of the job.
+            starting_z_position (float): The Z start of the first layer in microns, by default
+                the one stored in the archive.
+
+        Returns:
+            float: The Z start position of the layer in microns.
+        """
+        if starting_z_position is None:
+            layers = self.info_dict["Layers"]
+            starting_z_position = layers[0].get("LayerStartPosZInUM", 0) if layers else 0
+        return starting_z_position + self.z_offsets()[layer_index]
+
+    def get_height(self):
+        """
+        Get the total height of the layers in the PCB.
+
+        Returns:
+            float: The height in microns.
+        """
+        return self.z_offsets()[-1].item()
+
+    def read_values(self):
+        """
+        Read the GroupAxis and PrintAxis values from the info_dict.
+
+        Returns:
+            tuple: A tuple containing the GroupAxis and PrintAxis values as floats.
+        """
+        self.group_axis, self.print_axis = self.archive.position
+
+        # Read values into float variables
+        value1 = float(self.group_axis)
+        value2 = float(self.print_axis)
+
+        return value1, value2
+
+    def update_start_pos(self, group_pos, print_pos, save=True):
+        """
+        Update the GroupAxis and PrintAxis values in the info_dict.
+
+        Args:
+            group_pos (float): The new GroupAxis value.
+            print_pos (float): The new PrintAxis value.
+            save (bool): Write the archive now, False to batch the change with later ones.
+        """
+        self.info_dict['PositionInMM']['GroupAxis'] = group_pos
+        self.info_dict['PositionInMM']['PrintAxis'] = print_pos
+        self.dirty = True
+        if save:
+            self.save()
+        # self.start_pos = float(new_start_pos)
+
+    def combine_images(self, image1, image2, state):
+        """
+        Combine two images and color code them based on a state value.
+
+        Args:
+            image1 (QImage): The first image to combine.
+            image2 (QImage): The second image to combine.
+            state (int): The state value (1 or 0) to use for color coding.
+
+        Returns:
+            None.
+        """
+        # Build the color coded overlay from the separation masks in one pass
+        combined_image = composite_layer(image1, image2, state)
+
+        # Convert the QImage to QPixmap and return
+        self.last_codes = combined_image.ndarray
+        self.last_image = QtGui.QPixmap.fromImage(combined_image)
+
+    def _read_separation(self, path):
+        """
+        Decode one separation bitmap of the archive into a mask, see imaging.separation_mask.
+
+        The member is viewed in place when it is stored and uncompressed BMPs are decoded
+        straight from that view. Other formats go through QImage. The view is released
+        before returning, the mask never shares memory with it.
+        """
+        with self.archive.member_view(path) as data:
+            mask = bmp_mask(data)
+            if mask is None:
+                mask = separation_mask(QtGui.QImage.fromData(data))
+        return mask
+
+    def read_layer_codes(self, layer_index, progress=None, remember=True):
+        """
+        Read a layer from the zip file and combine its two separations into layer codes.
+
+        No pixmap is created, so this can run on a worker thread. Layers are served from
+        the layer cache when possible. The DI separation is decoded on SEPARATION_POOL
+        while the calling thread decodes the CI one.
+
+        Args:
+            layer_index (int): The index of the layer in the archive.
+            progress (callable): Optional callback taking (percent, text), called between
+                the loading stages. It may raise loader.LoadCancelled to stop the load.
+            remember (bool): Make it the layer read last, see read_layer_features. Layers
+                decoded ahead of time are not.
+
+        Returns:
+            numpy.ndarray: The uint8 layer codes, see imaging.layer_codes.
+        """
+        report = progress or (lambda percent, text: None)
+        if remember:
+            self.layer_index = layer_index
+        key = LAYER_CACHE.key(self.archive, layer_index)
+        codes = LAYER_CACHE.get(key)
+        if codes is not None:
+            report(90, 'layer %d found in cache' % layer_index)
+            return codes
+
+        # Get the paths to the two image files and decode them at the same time
+        image1_path, image2_path = self.archive.layer_files(layer_index)
+        report(10, 'reading separations of layer %d' % layer_index)
+        di_future = SEPARATION_POOL.submit(self._read_separation, image2_path) if image2_path != '' else None
+        try:
+            ci_mask = self._read_separation(image1_path) if image1_path != '' else None
+        finally:
+            di_mask = di_future.result() if di_future is not None else None
+        # A missing separation prints nothing
+        if ci_mask is None:
+            ci_mask = np.zeros(di_mask.shape, dtype=np.uint8)
+        elif di_mask is None:
+            di_mask = np.zeros(ci_mask.shape, dtype=np.uint8)
+
+        report(70, 'combining separations of layer %d' % layer_index)
+        codes = layer_codes(ci_mask, di_mask)
+        LAYER_CACHE.put(key, codes)
+        return codes
+
+    def read_layer_preview(self, layer_index, step):
+        """
+        Sample every step-th row and column of a layer that is not decoded yet, for a quick preview.
+
+        Only separations stored as uncompressed BMPs are sampled, straight from the archive
+        through member_view, so the preview costs a small part of the full decode.
+
+        Args:
+            layer_index (int): The index of the layer in the archive.
+            step (int): Sampling step in pixels.
+
+        Returns:
+            tuple: (codes, width, height), the sampled layer codes and the size of the full
+            layer. None if the layer is in the layer cache, so it loads at once anyway, or
+            if a separation is compressed or not a BMP.
+        """
+        if LAYER_CACHE.key(self.archive, layer_index) in LAYER_CACHE:
+            return None
+        masks, size = [], None
+        for path in self.archive.layer_files(layer_index):
+            if path == '':
+                masks.append(None)
+                continue
+            if self.archive.zip_file.getinfo(path).compress_type != zipfile.ZIP_STORED:
+                return None
+            with self.archive.member_view(path) as data:
+                mask = bmp_mask(data, step)
+                if mask is None:
+                    return None
+                size = size or bmp_size(data)
+            masks.append(mask)
+        ci_mask, di_mask = masks
+        if size is None:
+            return None
+        if ci_mask is None:
+            ci_mask = np.zeros(di_mask.shape, dtype=np.uint8)
+        elif di_mask is None:
+            di_mask = np.zeros(ci_mask.shape, dtype=np.uint8)
+        return (layer_codes(ci_mask, di_mask),) + size
+
+    def read_layer_image(self, layer_index):
+        """
+        Reads a layer from the zip file, combines the two separations into one image and returns the result.
+
+        Args:
+            layer_index (int): The index of the layer in the archive.
+
+        Returns:
+            The layer as a QPixmap object.
+        """
+        self.last_codes = self.read_layer_codes(layer_index)
+        self.last_image = QtGui.QPixmap.fromImage(codes_to_qimage(self.last_codes, 1))
+        return self.last_image
+
+    def read_layer_features(self, layer_index=None):
+        """
+        Detect the blobs, pads and corners of a layer, see features.detect_features.
+
+        Feature sets are cached per archive and layer, so aligning against the same base
+        again does not scan the layer again.
+
+        Args:
+            layer_index (int): The index of the layer in the archive, by default the layer read last.
+
+        Returns:
+            FeatureSet: The features of the layer.
+        """
+        if layer_index is None:
+            layer_index = self.layer_index
+        return FEATURE_CACHE.get(LAYER_CACHE.key(self.archive, layer_index),
+                                 lambda: detect_features(self.read_layer_codes(layer_index)))
+
+    def read_last_image(self):
+        """
+        Reads the last image from the zip file, combines the two layers into one image and returns the result.
+
+        Returns:
+            The last image in the zip file as a QPixmap object.
+        """
+        return self.read_layer_image(self.archive.layer_count - 2)
+
+    def read_first_image(self):
+        """
+        Reads the first image from the zip file, combines the two layers into one image and returns the result.
+
+        Returns:
+            The first image in the zip file as a QPixmap object.
+        """
+        return self.read_layer_image(0)
+
+    def update_z_start_pos(self, starting_z_position, save=True):
+        """
+        Updates the starting Z position of each layer in the zip file, starting from the given position.
+
+        Args:
+            starting_z_position: The starting Z position in micrometers.
+            save (bool): Write the archive now, False to batch the change with later ones.
+        """
+        self.set_z_starts(starting_z_position + self.z_offsets()[:-1], save)
+
+    def shift_z(self, delta, save=True):
+        """
+        Move every layer of the job up or down in Z.
+
+        Args:
+            delta (float): The shift in micrometers, layers without a Z start count as 0.
+            save (bool): Write the archive now, False to batch the change with later ones.
+        """
+        starts = np.array([layer.get("LayerStartPosZInUM", 0) for layer in self.info_dict["Layers"]])
+        self.set_z_starts(starts + delta, save)
+
+    def set_z_starts(self, z_starts, save=True):
+        """
+        Store the Z start position of every layer.
+
+        Args:
+            z_starts (numpy.ndarray): One Z start in micrometers per layer.
+            save (bool): Write the archive now, False to batch the change with later ones.
+        """
+        for layer, z_start in zip(self.info_dict["Layers"], z_starts.tolist()):
+            layer["LayerStartPosZInUM"] = z_start
+        self.dirty = True
+        if save:
+            self.save()
+
+    def save(self):
+        """
+        Saves the changes made to the pcbj.info file in the zip file.
+
+        Inside a transaction the write is deferred to the end of the transaction.
+        """
+        self.dirty = True
+        if self._transaction_depth == 0:
+            self.commit()
@@ -0,0 +1,173 @@
+import collections
+import hashlib
+import os
+import threading
+import numpy as np
+
+
+class LayerCache:
+    """
+    LRU cache of composited layers, shared by every ZipFileReader.
+
+    Layers are stored as the uint8 code arrays built by imaging.layer_codes and keyed by
+    archive path, layer index and the identity of the bitmap members of the layer, so a
+    layer is decoded again only when its bitmaps change, see key. The memory used is bounded in megabytes; the least recently used
+    layers are dropped first. The on-disk tier is off unless a folder is given, layers
+    are then also written there as .npy files, so they survive a restart of the tool.
+    """
+
+    def __init__(self, max_megabytes=1024, disk_dir=None, max_disk_megabytes=2048):
+        """
+        Args:
+            max_megabytes (float): Memory limit of the cache.
+            disk_dir (str): Folder of the optional on-disk cache, None (the default) keeps
+                the layers in memory only.
+            max_disk_megabytes (float): Size limit of the on-disk cache.
+        """
+        self.max_bytes = int(max_megabytes * 1024 * 1024)
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = int(max_disk_megabytes * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(archive, layer_index):
+        """
+        Build the cache key of a layer from the bitmap members it is decoded from.
+
+        The members are identified by name, CRC and sizes from the zip directory, not by
+        the modification time of the archive, so rewriting pcbj.info (Update SP) keeps
+        every cached layer and feature set. Member offsets are left out since they move
+        when a pcbj.info stored before the bitmaps changes length.
+
+        Args:
+            archive (PcbjcArchive): The open archive.
+            layer_index (int): The index of the layer in the archive.
+
+        Returns:
+            tuple: (absolute path, layer index, (name, CRC, compressed size, size) of each
+            separation, None for a separation that does not print).
+        """
+        members = []
+        for name in archive.layer_files(layer_index):
+            if not name:
+                members.append(None)
+                continue
+            member = archive.zip_file.getinfo(name)
+            members.append((name, member.CRC, member.compress_size, member.file_size))
+        return os.path.abspath(archive.file_path), layer_index, tuple(members)
+
+    @property
+    def size_megabytes(self):
+        return self._size / (1024 * 1024)
+
+    def __contains__(self, key):
+        """
+        Check whether a layer is held in memory, without counting a hit or reading the on-disk cache.
+        """
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """
+        Return the cached codes of a layer, or None if the layer is not cached.
+        """
+        with self._lock:
+            codes = self._entries.get(key)
+            if codes is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return codes
+        codes = self._load(key)
+        if codes is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, codes)
+        return codes
+
+    def put(self, key, codes):
+        """
+        Store the codes of a layer, in memory and in the on-disk cache if there is one.
+        """
+        self._remember(key, codes)
+        if self.disk_dir:
+            self._save(key, codes)
+
+    def clear(self):
+        """
+        Drop every layer held in memory. The on-disk cache is kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remember(self, key, codes):
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key).nbytes
+            if codes.nbytes > self.max_bytes:
+                return
+            self._entries[key] = codes
+            self._size += codes.nbytes
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, digest + '.npy')
+
+    def _load(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            codes = np.load(path)
+        except (OSError, ValueError):
+            return None
+        # touch the file so pruning drops the least recently used layers first
+        os.utime(path)
+        return _pad_rows(codes)
+
+    def _save(self, key, codes):
+        path = self._disk_path(key)
+        try:
+            np.save(path + '.tmp.npy', codes)
+            os.replace(path + '.tmp.npy', path)
+        except OSError:
+            return
+        self._prune_disk()
+
+    def _prune_disk(self):
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith('.npy'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def _pad_rows(codes):
+    """
+    Return the codes with rows padded to a multiple of 4 bytes, as QImage expects them.
+    """
+    height, width = codes.shape
+    if codes.strides[0] % 4 == 0:
+        return codes
+    padded = np.zeros((height, (width + 3) & ~3), dtype=codes.dtype)[:, :width]
+    padded[:] = codes
+    return padded
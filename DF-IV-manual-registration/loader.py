@@ -0,0 +1,256 @@
+import concurrent.futures
+import threading
+from PyQt5 import QtCore
+from imaging import codes_to_qimage
+
+
+class LoadCancelled(Exception):
+    """
+    Raised from a progress callback to stop a layer load that was cancelled.
+    """
+
+
+class _LayerLoadSignals(QtCore.QObject):
+    # every signal carries the generation of the load it belongs to. Images travel as
+    # Python objects so the NumPy buffer attached to them is never left behind
+    progress = QtCore.pyqtSignal(int, int, str)
+    preview = QtCore.pyqtSignal(int, object, int, int)
+    loaded = QtCore.pyqtSignal(int, object, object)
+    failed = QtCore.pyqtSignal(int, str)
+    done = QtCore.pyqtSignal(int)
+
+
+class _LayerLoadTask(QtCore.QRunnable):
+    """
+    Open an archive and composite one of its layers on a QThreadPool thread.
+
+    Only QImages are created here; the pixmaps are made by the receiver on the GUI thread.
+    """
+
+    def __init__(self, generation, reader_class, file_path, layer, preview_step, signals, reader=None, pending=None):
+        super(_LayerLoadTask, self).__init__()
+        self.setAutoDelete(False)
+        self.generation = generation
+        self.reader_class = reader_class
+        self.file_path = file_path
+        self.layer = layer
+        self.preview_step = preview_step
+        self.signals = signals
+        self.reader = reader
+        self.pending = pending
+        self._cancelled = False
+        # set once run returns, see LayerLoader.finish
+        self.finished = threading.Event()
+
+    def cancel(self):
+        self._cancelled = True
+
+    def report(self, percent, text):
+        if self._cancelled:
+            raise LoadCancelled()
+        self.signals.progress.emit(self.generation, percent, text)
+
+    def run(self):
+        # a reader this task opened is closed unless it is handed over with the loaded signal
+        opened = None
+        try:
+            reader = self.reader
+            if reader is None:
+                self.report(0, 'opening ' + self.file_path)
+                reader = opened = self.reader_class(self.file_path)
+            if self.layer == 'first':
+                layer_index = 0
+            elif self.layer == 'last':
+                layer_index = reader.archive.layer_count - 2
+            else:
+                layer_index = self.layer
+            if self.pending is not None:
+                # the layer is being prefetched, it is in the layer cache once that is done
+                self.report(0, 'waiting for layer %d' % layer_index)
+                concurrent.futures.wait([self.pending])
+            elif self.preview_step > 1:
+                preview = reader.read_layer_preview(layer_index, self.preview_step)
+                if preview is not None:
+                    codes, width, height = preview
+                    self.report(5, 'preview ready, decoding layer %d' % layer_index)
+                    self.signals.preview.emit(self.generation, codes_to_qimage(codes, 1), width, height)
+            codes = reader.read_layer_codes(layer_index, self.report)
+            self.report(100, 'layer %d loaded' % layer_index)
+            self.signals.loaded.emit(self.generation, reader, codes_to_qimage(codes, 1))
+            opened = None
+        except LoadCancelled:
+            pass
+        except Exception as exc:
+            self.signals.failed.emit(self.generation, '%s: %s' % (type(exc).__name__, exc))
+        finally:
+            if opened is not None:
+                opened.archive.close()
+            self.finished.set()
+            try:
+                self.signals.done.emit(self.generation)
+            except RuntimeError:
+                # the application is shutting down and took the signals with it
+                pass
+
+
+class LayerLoader(QtCore.QObject):
+    """
+    Load composited layers in the background and report back through Qt signals.
+
+    Starting a new load cancels the one in progress; signals of cancelled or outdated
+    loads are never forwarded, so only the latest request reaches the GUI. Layers around
+    the one shown can be decoded ahead into the layer cache with prefetch.
+    """
+    progress = QtCore.pyqtSignal(int, str)
+    preview = QtCore.pyqtSignal(object, int, int)
+    loaded = QtCore.pyqtSignal(object, object)
+    failed = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+
+    def __init__(self, reader_class, preview_step=8, parent=None, pool=None):
+        """
+        Args:
+            reader_class (type): Opens an archive from its path, ZipFileReader.
+            preview_step (int): Sampling step of the preview shown before the full decode, 1
+                to skip the preview. Only layers of uncompressed BMPs get a preview, see
+                ZipFileReader.read_layer_preview.
+            parent (QObject): The Qt parent of the loader.
+            pool (QThreadPool): The pool to run on, the global pool by default.
+        """
+        super(LayerLoader, self).__init__(parent)
+        self.reader_class = reader_class
+        self.preview_step = preview_step
+        self.pool = pool or QtCore.QThreadPool.globalInstance()
+        self._generation = 0
+        self._task = None
+        # tasks are kept alive here until their thread is done with them
+        self._running = {}
+        self._prefetcher = None
+        self._prefetches = {}
+
+    def load(self, file_path, layer, reader=None):
+        """
+        Start loading a layer, cancelling the load in progress.
+
+        Args:
+            file_path (str): The path to the .pcbjc file.
+            layer: 'first', 'last' (the second to last layer, as read_last_image) or an index.
+            reader: An open reader of the file to read from, a new one is opened by default.
+        """
+        self.cancel()
+        pending = self._prefetches.get((file_path, layer))
+        self._generation += 1
+        # every task owns its signals, so they outlive the loader if the task is still running
+        signals = _LayerLoadSignals()
+        signals.progress.connect(self._on_progress)
+        signals.preview.connect(self._on_preview)
+        signals.loaded.connect(self._on_loaded)
+        signals.failed.connect(self._on_failed)
+        signals.done.connect(self._on_done)
+        self._task = _LayerLoadTask(self._generation, self.reader_class, file_path, layer,
+                                    self.preview_step, signals, reader, pending)
+        self._running[self._generation] = self._task
+        self.pool.start(self._task)
+
+    def cancel(self):
+        """
+        Cancel the load in progress, if any.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self.cancelled.emit()
+
+    def isLoading(self):
+        return self._task is not None
+
+    def prefetch(self, reader, layer_indices, workers=2):
+        """
+        Decode layers into the layer cache in the background, so showing them later is instant.
+
+        Prefetches asked for earlier that did not start yet are dropped, so scrubbing
+        through a job never queues more than the last few layers.
+
+        Args:
+            reader: The open reader of the job, see ZipFileReader.read_layer_codes.
+            layer_indices (list): The layers to decode, most wanted first.
+            workers (int): Number of prefetch threads, used when the first prefetch starts.
+        """
+        if self._prefetcher is None:
+            self._prefetcher = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                                     thread_name_prefix='prefetch')
+        wanted = [(reader.file_path, index) for index in layer_indices]
+        for key, future in list(self._prefetches.items()):
+            if future.done() or (key not in wanted and future.cancel()):
+                del self._prefetches[key]
+        for key in wanted:
+            if key not in self._prefetches:
+                self._prefetches[key] = self._prefetcher.submit(self._prefetch, reader, key[1])
+
+    @staticmethod
+    def _prefetch(reader, layer_index):
+        try:
+            reader.read_layer_codes(layer_index, remember=False)
+        except Exception:
+            # a layer that cannot be read is reported when it is loaded for real
+            pass
+
+    def finish_prefetches(self):
+        """
+        Drop the prefetches that did not start yet and wait for the running ones.
+        """
+        for future in self._prefetches.values():
+            future.cancel()
+        concurrent.futures.wait(list(self._prefetches.values()))
+        self._prefetches.clear()
+
+    def finish(self):
+        """
+        Drop the prefetches that did not start yet and wait for the running prefetches and loads.
+
+        The loads and prefetches read through the readers they were given. Call this before
+        one of them writes its archive, so no thread reads it while save_info closes and
+        reopens it. The load in progress is not cancelled, its result is still delivered.
+        """
+        self.finish_prefetches()
+        for task in list(self._running.values()):
+            task.finished.wait()
+
+    def shutdown(self):
+        """
+        Cancel the load in progress and the prefetches that did not start yet.
+        """
+        self.cancel()
+        if self._prefetcher is not None:
+            self._prefetcher.shutdown(wait=False, cancel_futures=True)
+            self._prefetcher = None
+        self._prefetches.clear()
+
+    def _current(self, generation):
+        return self._task is not None and generation == self._generation
+
+    def _on_progress(self, generation, percent, text):
+        if self._current(generation):
+            self.progress.emit(percent, text)
+
+    def _on_preview(self, generation, image, width, height):
+        if self._current(generation):
+            self.preview.emit(image, width, height)
+
+    def _on_loaded(self, generation, reader, image):
+        if self._current(generation):
+            self._task = None
+            self.loaded.emit(reader, image)
+            return
+        task = self._running.get(generation)
+        if task is not None and task.reader is None:
+            # an outdated load opened this reader and nobody will use it
+            reader.archive.close()
+
+    def _on_failed(self, generation, message):
+        if self._current(generation):
+            self._task = None
+            self.failed.emit(message)
+
+    def _on_done(self, generation):
+        self._running.pop(generation, None)
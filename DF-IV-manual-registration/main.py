@@ -2,268 +2,24 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtCore import Qt
 import math
 import numpy as np
-import qimage2ndarray
-import json
-import zipfile
-import shutil
+import os
+import sys
+from imaging import find_drops, array_to_polygon
+from loader import LayerLoader
+from job_reader import ZipFileReader
+from tiles import TiledImageItem
+from registration import auto_align
+from features import match_features
+from overlap import OverlapAnalysis
+
+# auto align results below this correlation peak are shown but not applied
+AUTO_ALIGN_MIN_CONFIDENCE = 0.2
+# feature align results matching less than this part of the top features are not applied
+FEATURE_ALIGN_MIN_CONFIDENCE = 0.3
+# the overlap of a moved top image is analyzed once it rests this long, in milliseconds
+OVERLAP_SETTLE_MS = 150
 
 
-class ZipFileReader:
-    def __init__(self,file_path):
-        """
-        Initialize a ZipFileReader instance.
-
-        Args:
-            file_path (str): The path to the ZIP file to read.
-        """
-        self.file_path = file_path
-        self.zip_file = None
-        self.info_dict = None
-        self.start_pos = 0.0
-        self.end_pos = 0.0
-        self.zip_file = zipfile.ZipFile(self.file_path, 'r')
-        with self.zip_file.open('pcbj.info') as info_file:
-            self.info_dict = json.load(info_file)
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        """
-        Clean up resources associated with the ZipFileReader instance.
-        """
-        if self.zip_file is not None:
-            self.zip_file.close()
-
-    def change_white_pixels(self, image, new_color):
-        """
-        Change all white pixels in the given image to the specified color.
-
-        Args:
-            image (QImage): The image to modify.
-            new_color (QColor): The new color to use for white pixels.
-
-        Returns:
-            QImage: The modified image.
-        """
-        white = QtGui.QColor(255, 255, 255)
-        for x in range(image.width()):
-            for y in range(image.height()):
-                color = QtGui.QColor(image.pixel(x, y))
-                if color == white:
-                    image.setPixelColor(x, y, new_color)
-        return image
-
-    def get_height(self):
-        """
-        Get the total height of the layers in the PCB.
-
-        Returns:
-            float: The height in microns.
-        """
-        layers = self.info_dict["Layers"]
-        current_z = 0
-        for layer in layers:
-            if layer["Separations"][0]['File']:
-                current_z += layer["Separations"][0]["LayerThicknessUM"]
-            else:
-                current_z += layer["Separations"][1]["LayerThicknessUM"]
-        return current_z
-        
-        pass
-
-    def read_values(self):
-        """
-        Read the GroupAxis and PrintAxis values from the info_dict.
-
-        Returns:
-            tuple: A tuple containing the GroupAxis and PrintAxis values as floats.
-        """
-        self.group_axis = float(self.info_dict['PositionInMM'].get('GroupAxis', 0.0))
-        self.print_axis = float(self.info_dict['PositionInMM'].get('PrintAxis', 0.0))
-
-        # Read values into float variables
-        value1 = float(self.group_axis)
-        value2 = float(self.print_axis)
-
-        return value1, value2
-
-    def update_start_pos(self, group_pos, print_pos):
-        """
-        Update the GroupAxis and PrintAxis values in the info_dict.
-
-        Args:
-            group_pos (float): The new GroupAxis value.
-            print_pos (float): The new PrintAxis value.
-        """
-        self.info_dict['PositionInMM']['GroupAxis'] = group_pos
-        self.info_dict['PositionInMM']['PrintAxis'] = print_pos
-        self.save()
-        # self.start_pos = float(new_start_pos)
-
-    def combine_images(self, image1, image2, state):
-        """
-        Combine two images and color code them based on a state value.
-
-        Args:
-            image1 (QImage): The first image to combine.
-            image2 (QImage): The second image to combine.
-            state (int): The state value (1 or 0) to use for color coding.
-
-        Returns:
-            None.
-        """
-        # Create a new image to hold the combined pixels
-        combined_image = QtGui.QImage(image1.width(), image1.height(), QtGui.QImage.Format_RGB32)
-        # Fill the image with black
-        combined_image.fill(QtGui.QColor(0, 0, 0))
-
-        # Create a QPainter to draw on the combined image
-        painter = QtGui.QPainter(combined_image)
-
-        # Draw the non-black pixels from the first image onto the combined image
-        for x in range(image1.width()):
-            for y in range(image1.height()):
-                pixel = QtGui.QColor(image1.pixel(x, y))
-                if pixel.red() > 0 or pixel.green() > 0 or pixel.blue() > 0:
-                    if state == 1:
-                        painter.setPen(QtGui.QColor(0, 255, 0, 255))
-                        painter.drawPoint(x, y)
-                    else:
-                        painter.setPen(QtGui.QColor(0, 255, 0, 120))
-                        painter.drawPoint(x, y)
-
-        # Draw the non-black pixels from the second image onto the combined image
-        for x in range(image2.width()):
-            for y in range(image2.height()):
-                pixel = QtGui.QColor(image2.pixel(x, y))
-                if pixel.red() > 0 or pixel.green() > 0 or pixel.blue() > 0:
-                    if state == 1:
-                        painter.setPen(QtGui.QColor(255, 255, 0, 255))
-                        painter.drawPoint(x, y)
-                    else:
-                        painter.setPen(QtGui.QColor(255, 255, 0, 120))
-                        painter.drawPoint(x, y)
-
-        # Clean up
-        painter.end()
-
-        # Convert the QImage to QPixmap and return
-        self.last_image = QtGui.QPixmap.fromImage(combined_image)
-
-
-    def read_last_image(self):
-        """
-        Reads the last image from the zip file, combines the two layers into one image and returns the result.
-
-        Returns:
-            The last image in the zip file as a QPixmap object.
-        """
-        # Get the paths to the two image files
-        image1_path = self.info_dict['Layers'][len(self.info_dict['Layers'])-2]['Separations'][0]['File']
-        image2_path = self.info_dict['Layers'][len(self.info_dict['Layers'])-2]['Separations'][1]['File']
-        if not image1_path == '' and not image2_path == '':
-            # Read the images from the Zip file
-            image1_data = self.zip_file.read(image1_path)
-            image2_data = self.zip_file.read(image2_path)
-
-
-            # Convert the images to QImages
-            image1_qt = QtGui.QImage.fromData(image1_data)
-            image2_qt = QtGui.QImage.fromData(image2_data)
-
-      
-            self.combine_images(image1_qt, image2_qt, 1)
-        elif image1_path == '':
-            image2_data = self.zip_file.read(image2_path)
-            image2_qt = QtGui.QImage.fromData(image2_data)
-            image1_qt = QtGui.QImage(image2_qt.width(), image2_qt.height(), QtGui.QImage.Format_RGB32)
-            # Fill the image with black
-            image1_qt.fill(QtGui.QColor(0, 0, 0))
-            self.combine_images(image1_qt, image2_qt, 1)
-        elif image2_path == '':
-            image1_data = self.zip_file.read(image1_path)
-            image1_qt = QtGui.QImage.fromData(image1_data)
-            image2_qt = QtGui.QImage(image1_qt.width(), image1_qt.height(), QtGui.QImage.Format_RGB32)
-            # Fill the image with black
-            image2_qt.fill(QtGui.QColor(0, 0, 0))
-            self.combine_images(image1_qt, image2_qt, 1)
-        return self.last_image
-
-    
-    def read_first_image(self):
-        """
-        Reads the first image from the zip file, combines the two layers into one image and returns the result.
-
-        Returns:
-            The first image in the zip file as a QPixmap object.
-        """
-       # Get the paths to the two image files
-        image1_path = self.info_dict['Layers'][0]['Separations'][0]['File']
-        image2_path = self.info_dict['Layers'][0]['Separations'][1]['File']
-        if not image1_path == '' and not image2_path == '':
-            # Read the images from the Zip file
-            image1_data = self.zip_file.read(image1_path)
-            image2_data = self.zip_file.read(image2_path)
-
-
-            # Convert the images to QImages
-            image1_qt = QtGui.QImage.fromData(image1_data)
-            image2_qt = QtGui.QImage.fromData(image2_data)
-
-
-
-            self.combine_images(image1_qt, image2_qt, 1)
-        elif image1_path == '':
-            image2_data = self.zip_file.read(image2_path)
-            image2_qt = QtGui.QImage.fromData(image2_data)
-            image1_qt = QtGui.QImage(image2_qt.width(), image2_qt.height(), QtGui.QImage.Format_RGB32)
-            # Fill the image with black
-            image1_qt.fill(QtGui.QColor(0, 0, 0))
-            self.combine_images(image1_qt, image2_qt, 1)
-        elif image2_path == '':
-            image1_data = self.zip_file.read(image1_path)
-            image1_qt = QtGui.QImage.fromData(image1_data)
-            image2_qt = QtGui.QImage(image1_qt.width(), image1_qt.height(), QtGui.QImage.Format_RGB32)
-            # Fill the image with black
-            image2_qt.fill(QtGui.QColor(0, 0, 0))
-            self.combine_images(image1_qt, image2_qt, 1)
-        return self.last_image
-    
-    def update_z_start_pos(self, starting_z_position):
-        """
-        Updates the starting Z position of each layer in the zip file, starting from the given position.
-
-        Args:
-            starting_z_position: The starting Z position in micrometers.
-        """
-        layers = self.info_dict["Layers"]
-        current_z = starting_z_position
-        for layer in layers:
-            layer["LayerStartPosZInUM"] = current_z
-            if layer["Separations"][0]['File']:
-                current_z += layer["Separations"][0]["LayerThicknessUM"]
-            else:
-                current_z += layer["Separations"][1]["LayerThicknessUM"]
-        self.save()
-
-    def save(self):
-        """
-        Saves the changes made to the pcbj.info file in the zip file.
-        """
-            # Create a temporary file to write the updated ZIP data to
-        temp_file_path = self.file_path + '.temp'
-
-        # Open the input ZIP file and the temporary file for writing
-        with zipfile.ZipFile(self.file_path, 'r') as input_zip_file, \
-            zipfile.ZipFile(temp_file_path, 'w') as temp_zip_file:
-            # Iterate over all files in the input ZIP file
-            for name in input_zip_file.namelist():
-                # If the file is not the one we want to delete, copy it over to the temporary file
-                if name != 'pcbj.info':
-                    with input_zip_file.open(name) as source_file:
-                        temp_zip_file.writestr(name, source_file.read())
-            temp_zip_file.writestr('pcbj.info', json.dumps(self.info_dict, indent=4))
-
-        # Replace the original file with the temporary file
-        shutil.move(temp_file_path, self.file_path)
 ##################################################################################
 class RulerLineItem(QtWidgets.QGraphicsLineItem):
     def __init__(self):
@@ -337,19 +93,18 @@ class trayRectItem(QtWidgets.QGraphicsRectItem):
         self.setRect(xCenter-trayWidth/2,yCenter-trayHeight/2,trayWidth,trayHeight)
 
 
-class DropGroupItemGroup(QtWidgets.QGraphicsItemGroup):
+class DropItem(QtWidgets.QGraphicsItem):
+    """
+    Single graphics item painting the CI and DI drops of a region from NumPy coordinate buffers.
+    """
     def __init__(self):
-        super(DropGroupItemGroup, self).__init__()
+        super(DropItem, self).__init__()
         self.dropSizeInPixel = 2.2
-        self.penCI = QtGui.QPen()  
-        self.penCI.setWidthF(0.02)
-        self.penCI.setStyle(Qt.SolidLine)
-        self.penCI.setBrush(Qt.white)
-
-        self.penDI = QtGui.QPen()  
-        self.penDI.setWidthF(0.02)
-        self.penDI.setStyle(Qt.SolidLine)
-        self.penDI.setBrush(Qt.yellow)
+        self.setZValue(2)
+        self.setFlag(QtWidgets.QGraphicsItem.ItemUsesExtendedStyleOption, True)
+        self._rect = QtCore.QRectF()
+        self._ciDrops = np.empty((0, 2))
+        self._diDrops = np.empty((0, 2))
 
         colorCI = QtGui.QColor(200,200,200,180)
         self.brushCI = QtGui.QBrush() # creates a QBrush pen
@@ -361,23 +116,41 @@ class DropGroupItemGroup(QtWidgets.QGraphicsItemGroup):
         self.brushDI.setColor(colorDI)
         self.brushDI.setStyle(Qt.SolidPattern)
 
-    def drawCIDrops(self,items):
-        for item in items:
-            x = item[1]-self.dropSizeInPixel/2
-            y = item[0]-self.dropSizeInPixel/2
-            drop = QtWidgets.QGraphicsEllipseItem(x,y,self.dropSizeInPixel,self.dropSizeInPixel)
-            drop.setBrush(self.brushCI)
-            drop.setPen(self.penCI)
-            self.addToGroup(drop)
-
-    def drawDIDrops(self,items):
-        for item in items:
-            x = item[1]-self.dropSizeInPixel/2
-            y = item[0]-self.dropSizeInPixel/2
-            drop = QtWidgets.QGraphicsEllipseItem(x,y,self.dropSizeInPixel,self.dropSizeInPixel)
-            drop.setBrush(self.brushDI)
-            drop.setPen(self.penDI)
-            self.addToGroup(drop)
+        # a round pen as wide as a drop paints every drop as a disc, so a region is drawn in one call
+        self.penCI = QtGui.QPen(self.brushCI, self.dropSizeInPixel, Qt.SolidLine, Qt.RoundCap)
+        self.penDI = QtGui.QPen(self.brushDI, self.dropSizeInPixel, Qt.SolidLine, Qt.RoundCap)
+
+    def setDrops(self, rect, ci_drops, di_drops):
+        """
+        Replace the drops shown by the item.
+
+        Args:
+            rect (QRectF): The scene region the drops were searched in.
+            ci_drops (numpy.ndarray): (n, 2) array of CI drop centers, see imaging.find_drops.
+            di_drops (numpy.ndarray): (n, 2) array of DI drop centers.
+        """
+        self.prepareGeometryChange()
+        margin = self.dropSizeInPixel
+        self._rect = QtCore.QRectF(rect).adjusted(-margin, -margin, margin, margin)
+        self._ciDrops = ci_drops
+        self._diDrops = di_drops
+        self.update()
+
+    def clear(self):
+        self.setDrops(QtCore.QRectF(), np.empty((0, 2)), np.empty((0, 2)))
+
+    def boundingRect(self):
+        return self._rect
+
+    def paint(self, painter, option, widget=None):
+        exposed = option.exposedRect
+        radius = self.dropSizeInPixel / 2
+        for drops, pen in ((self._ciDrops, self.penCI), (self._diDrops, self.penDI)):
+            # only the drops touching the exposed rectangle are painted
+            visible = drops[(drops[:, 0] > exposed.left() - radius) & (drops[:, 0] < exposed.right() + radius) &
+                            (drops[:, 1] > exposed.top() - radius) & (drops[:, 1] < exposed.bottom() + radius)]
+            painter.setPen(pen)
+            painter.drawPoints(array_to_polygon(visible))
 
 
 class Viewer(QtWidgets.QGraphicsView):
@@ -397,19 +170,33 @@ class Viewer(QtWidgets.QGraphicsView):
         self.ResolutionInUM_GroupAxis = 35.25
 
         self._empty = True
+        self._imageSize = QtCore.QSizeF()
         self._scene = QtWidgets.QGraphicsScene(self)
-        self._photo = QtWidgets.QGraphicsPixmapItem()
-        self._groupGrid = QtWidgets.QGraphicsItemGroup()
+        self._photo = TiledImageItem()
         self._RulerLine = RulerLineItem()
         self._tray = trayRectItem()
-        self._scene.addItem(self._groupGrid)
+        self._drops = DropItem()
+        self._dropRect = QtCore.QRectF()
+        self._showDrops = False
+        self._dropMinScale = 25
         self._scene.addItem(self._photo)
         self._scene.addItem(self._RulerLine)
         self._scene.addItem(self._tray)
+        self._scene.addItem(self._drops)
 
 
         self._mousePressd = False
         self._showGrid = False
+        self._gridMinScale = 2
+
+        self._gridPenMajor = QtGui.QPen()  # every 10th grid line
+        self._gridPenMajor.setStyle(Qt.SolidLine)
+        self._gridPenMajor.setBrush(Qt.white)
+        self._gridPenMajor.setWidthF(0.2)
+        self._gridPenMinor = QtGui.QPen()
+        self._gridPenMinor.setStyle(Qt.SolidLine)
+        self._gridPenMinor.setBrush(Qt.white)
+        self._gridPenMinor.setWidthF(0.05)
         
 
         self.setScene(self._scene)
@@ -420,105 +207,98 @@ class Viewer(QtWidgets.QGraphicsView):
         self.setBackgroundBrush(QtGui.QBrush(QtGui.QColor(30, 30, 30)))
         self.setFrameShape(QtWidgets.QFrame.NoFrame)
         self.setDragMode(QtWidgets.QGraphicsView.ScrollHandDrag)
+        self.horizontalScrollBar().valueChanged.connect(self.updateDrops)
+        self.verticalScrollBar().valueChanged.connect(self.updateDrops)
 
     def drawTray(self):
         self._tray.ResolutionInUM_PrintAxis = self.ResolutionInUM_PrintAxis
         self._tray.ResolutionInUM_GroupAxis = self.ResolutionInUM_GroupAxis
-        rect = QtCore.QRectF(self._photo.pixmap().rect())
+        rect = self.photoRect()
         self._tray.setImageSize(rect.width(),rect.height())
         self._tray.draw()
         # self._scene.setSceneRect(10000,10000,-10000,-10000)
         # 
-    def drawGrid(self):
-        self._scene.removeItem(self._groupGrid)
-        self._groupGrid = QtWidgets.QGraphicsItemGroup()
-        rect = QtCore.QRectF(self._photo.pixmap().rect())
-        width,height=int(rect.width()),int(rect.height())
-
-        pen1 = QtGui.QPen()  # creates a default pen
-        pen1.setStyle(Qt.SolidLine)
-        pen1.setBrush(Qt.white)
-        pen1.setWidthF(0.2)
-        pen2 = QtGui.QPen()  # creates a default pen
-        pen2.setStyle(Qt.SolidLine)
-        pen2.setBrush(Qt.white)
-        pen2.setWidthF(0.05)
-
-        for index in range(width+1):
-            line = QtWidgets.QGraphicsLineItem(index,0,index,height)
-            line.setCacheMode(QtWidgets.QGraphicsItem.DeviceCoordinateCache)
-            if index % 10 == 0:
-                line.setPen(pen1)
-            else:
-                line.setPen(pen2)
-            self._groupGrid.addToGroup(line)
-
-        for index in range(height+1):
-            line = QtWidgets.QGraphicsLineItem(0,index,width,index)
-            line.setCacheMode(QtWidgets.QGraphicsItem.DeviceCoordinateCache)
-            if index % 10 == 0:
-                line.setPen(pen1)
-            else:
-                line.setPen(pen2)
-            self._groupGrid.addToGroup(line)
-
-        self._scene.addItem(self._groupGrid)
-        self._groupGrid.hide()
-
-    def getPixmapInNpArray(self):
-        pixmap = self._photo.pixmap()
-        h = pixmap.size().width()
-        w = pixmap.size().height()
-        channels_count = 4
-        image = pixmap.toImage()
-        s = image.bits().asstring(w * h * channels_count)
-        arr = np.frombuffer(s, dtype=np.uint8).reshape((w, h, channels_count)) 
-        return arr
+    def drawForeground(self, painter, rect):
+        """
+        Draw the pixel grid over the visible part of the photo.
+
+        The grid is only drawn above a zoom factor of _gridMinScale, with a thicker line
+        every 10 pixels. Only the lines crossing rect are drawn, so the cost depends on
+        the size of the viewport and not on the size of the photo.
+        """
+        super(Viewer, self).drawForeground(painter, rect)
+        if not self._showGrid or not self.hasPhoto() or self.getScaleFactor() <= self._gridMinScale:
+            return
+        area = rect.intersected(self.photoRect())
+        if area.isEmpty():
+            return
+        left, right = math.floor(area.left()), math.ceil(area.right())
+        top, bottom = math.floor(area.top()), math.ceil(area.bottom())
+
+        major, minor = [], []
+        for index in range(left, right + 1):
+            line = QtCore.QLineF(index, top, index, bottom)
+            (major if index % 10 == 0 else minor).append(line)
+        for index in range(top, bottom + 1):
+            line = QtCore.QLineF(left, index, right, index)
+            (major if index % 10 == 0 else minor).append(line)
+
+        painter.save()
+        painter.setPen(self._gridPenMajor)
+        painter.drawLines(major)
+        painter.setPen(self._gridPenMinor)
+        painter.drawLines(minor)
+        painter.restore()
 
     def drawDrop(self):
-        self.resetDropItemGroup()
-        rect = QtCore.QRectF(self._photo.pixmap().rect())
-        
-        viewrect = self.viewport().rect()
-        x,y = viewrect.x(),viewrect.y()
-        h,w = viewrect.height(),viewrect.width()
-        point1 = self.mapToScene(x,y)
-        point2 = self.mapToScene(x+w,y+w)
-        x1,y1 = int(point1.x()),int(point1.y())
-        x2,y2 = int(point2.x()),int(point2.y())
-        img = self.getPixmapInNpArray()
-
-        kernel = np.array([[1,1],[1,1]])
-        CiImg = img[:, :, 0].astype(bool).astype("uint8")
-        DiImg = img[:, :, 1].astype(bool).astype("uint8")
-
-        # do the convolve
-        CiImg_coords = np.argwhere(CiImg == 4)
-        DiImg_coords = np.argwhere(DiImg == 4)
-        
-        CiImg_newCoo = []
-        print(x1,y1,x2,y2)
-        for coord in CiImg_coords:
-            if y1 < coord[0] <y2 and x1 < coord[1] <x2:
-                # shift the coodinate for one pixel in x and y
-                CiImg_newCoo.append(coord)
-
-        DiImg_newCoo = []
-        for coord in DiImg_coords:
-            if y1 < coord[0] <y2 and x1 < coord[1] <x2:
-                # shift the coodinate for one pixel in x and y
-                DiImg_newCoo.append(coord)
-
-        self._dropGroup = DropGroupItemGroup()
-        self._scene.addItem(self._dropGroup)
-        self._dropGroup.drawCIDrops(CiImg_newCoo)
-        self._dropGroup.drawDIDrops(DiImg_newCoo)
+        """
+        Find the drops around the viewport and show them.
+
+        Drops are searched in the visible scene rect grown by one viewport on every side,
+        so panning only searches again once the view leaves that region.
+        """
+        codes = self._photo.codes()
+        if codes is None:
+            return
+        visible = self.mapToScene(self.viewport().rect()).boundingRect()
+        if self._dropRect.contains(visible):
+            return
+        region = visible.adjusted(-visible.width(), -visible.height(),
+                                  visible.width(), visible.height()).intersected(self.photoRect())
+        left, top = math.floor(region.left()), math.floor(region.top())
+        right, bottom = math.ceil(region.right()), math.ceil(region.bottom())
+        self._drops.setDrops(region,
+                             find_drops(codes, 1, left, top, right, bottom),
+                             find_drops(codes, 2, left, top, right, bottom))
+        self._dropRect = region
+
+    def showDrops(self, show=True):
+        self._showDrops = show
+        if show:
+            self.updateDrops()
+        else:
+            self.resetDropItemGroup()
+
+    def updateDrops(self):
+        if not self._showDrops:
+            return
+        # drops are only searched when zoomed in far enough to tell them apart
+        if self.getScaleFactor() > self._dropMinScale:
+            self.drawDrop()
+        else:
+            self.resetDropItemGroup()
 
     def hasPhoto(self):
         return not self._empty
 
+    def photoRect(self):
+        """
+        The rectangle of the photo in scene coordinates, at full resolution even while a preview is shown.
+        """
+        return QtCore.QRectF(QtCore.QPointF(0, 0), self._imageSize)
+
     def fitInView(self, scale=True):
-        rect = QtCore.QRectF(self._photo.pixmap().rect())
+        rect = self.photoRect()
         if not rect.isNull():
             self.setSceneRect(rect)
             if self.hasPhoto():
@@ -538,35 +318,55 @@ class Viewer(QtWidgets.QGraphicsView):
 
     def scaleScene(self,factor):
         self.scale(factor, factor)
+        self.updateDrops()
         # self._RulerLine.scale(factor)
     
     def getScaleFactor(self):
         unity = self.transform().mapRect(QtCore.QRectF(0, 0, 1, 1))
         return unity.width()
 
-    def setPhoto(self, pixmap=None):
-        if pixmap and not pixmap.isNull():
+    def setPhoto(self, image=None, size=None):
+        """
+        Show a layer, painted as tiles from a pyramid of the layer codes.
+
+        Args:
+            image (QImage): An image made by imaging.codes_to_qimage, None to clear the viewer.
+            size (QSizeF): The full resolution size when image is a preview, see TiledImageItem.setImage.
+        """
+        if image is not None and not image.isNull():
             self._empty = False
-            self._photo.setPixmap(pixmap)
+            self._photo.setImage(image, size)
+            self._imageSize = self._photo.boundingRect().size()
         else:
             self._empty = True
             self.setDragMode(QtWidgets.QGraphicsView.NoDrag)
-            self._photo.setPixmap(QtGui.QPixmap())
+            self._photo.setImage(None)
+            self._imageSize = QtCore.QSizeF()
         # self.resetDRCItemGroup()
         self.resetDropItemGroup()
 
-    def setNewPhoto(self, pixmap=None):
-        self.setPhoto(pixmap)
-        self.drawGrid()
+    def setPreview(self, image, width, height):
+        """
+        Show a low resolution preview stretched over the size of the full resolution image.
+
+        Args:
+            image (QImage): The preview image.
+            width (int): The width of the full resolution image.
+            height (int): The height of the full resolution image.
+        """
+        self.setPhoto(image, QtCore.QSizeF(width, height))
+        self.drawTray()
+        self.fitInView()
+
+    def setNewPhoto(self, image=None):
+        self.setPhoto(image)
         self.drawTray()
         self.fitInView()
         # self._zoom = 0
 
     def resetDropItemGroup(self):
-        try:
-            self._scene.removeItem(self._dropGroup)
-        except:
-            pass
+        self._drops.clear()
+        self._dropRect = QtCore.QRectF()
         
 
     def wheelEvent(self, event):
@@ -584,7 +384,7 @@ class Viewer(QtWidgets.QGraphicsView):
 
     def toggleGrid(self):
         self._showGrid = not self._showGrid
-        self.update()
+        self.viewport().update()
 
     def QPointF2QPoint_floor(self,QPointF):
         return QtCore.QPoint(math.floor(QPointF.x()),math.floor(QPointF.y()))
@@ -592,7 +392,7 @@ class Viewer(QtWidgets.QGraphicsView):
     def toggleDragMode(self):
         if self.dragMode() == QtWidgets.QGraphicsView.ScrollHandDrag:
             self.setDragMode(QtWidgets.QGraphicsView.NoDrag)
-        elif not self._photo.pixmap().isNull():
+        elif self.hasPhoto():
             self.setDragMode(QtWidgets.QGraphicsView.ScrollHandDrag)
 
     def mousePressEvent(self, event):
@@ -615,13 +415,6 @@ class Viewer(QtWidgets.QGraphicsView):
             self.update()
         return super().mouseReleaseEvent(event)
 
-    def paintEvent(self, event: QtGui.QPaintEvent) -> None:
-        if self.getScaleFactor() > 2 and self._showGrid:
-            self._groupGrid.show()
-        else:
-            self._groupGrid.hide()
-        return super().paintEvent(event)
-
 class ImageViewer(QtWidgets.QWidget):
     class _RulerMode():
         pixel = ...
@@ -651,11 +444,24 @@ class ImageViewer(QtWidgets.QWidget):
         self.update_button.setText('Update SP')
         self.update_button.setFlat(True)
         self.update_button.clicked.connect(self.update)
+        self.update_button.setEnabled(False)
         # '2nd image button'
         self.load_top_file_button = QtWidgets.QPushButton(self)
         self.load_top_file_button.setText('Load Top File')
         self.load_top_file_button.setFlat(True)
         self.load_top_file_button.clicked.connect(self.load_top_file)
+        # 'auto align' button
+        self.auto_align_button = QtWidgets.QPushButton(self)
+        self.auto_align_button.setText('Auto align')
+        self.auto_align_button.setFlat(True)
+        self.auto_align_button.clicked.connect(self.auto_align_top_file)
+        self.auto_align_button.setEnabled(False)
+        # 'feature align' button
+        self.feature_align_button = QtWidgets.QPushButton(self)
+        self.feature_align_button.setText('Feature align')
+        self.feature_align_button.setFlat(True)
+        self.feature_align_button.clicked.connect(self.feature_align_top_file)
+        self.feature_align_button.setEnabled(False)
         # 'base file load' button
         self.base_file_button = QtWidgets.QPushButton(self)
         self.base_file_button.setText('load a base file')
@@ -679,11 +485,38 @@ class ImageViewer(QtWidgets.QWidget):
         self.btn_grid.setCheckable(True)
         self.btn_grid.clicked.connect(self.toggleGrid)
 
-        # self.btn_drop = QtWidgets.QPushButton(self)
-        # self.btn_drop.setText('drop')
-        # self.btn_drop.setFlat(True)
-        # self.btn_drop.clicked.connect(self.drawDrop)
-        # self.btn_drop.setDisabled(True)
+        self.btn_drop = QtWidgets.QPushButton(self)
+        self.btn_drop.setText('drop')
+        self.btn_drop.setFlat(True)
+        self.btn_drop.setCheckable(True)
+        self.btn_drop.clicked.connect(self.drawDrop)
+        self.btn_drop.setDisabled(True)
+
+        # overlap heatmap of the visible region, kept up to date while the top image is dragged
+        self.btn_overlap = QtWidgets.QPushButton(self)
+        self.btn_overlap.setText('overlap')
+        self.btn_overlap.setFlat(True)
+        self.btn_overlap.setCheckable(True)
+        self.btn_overlap.clicked.connect(self.toggleOverlap)
+        self.overlap = None
+        self._overlapTimer = QtCore.QTimer(self)
+        self._overlapTimer.setSingleShot(True)
+        self._overlapTimer.timeout.connect(self.refreshOverlap)
+        self.viewer.horizontalScrollBar().valueChanged.connect(self.scheduleOverlap)
+        self.viewer.verticalScrollBar().valueChanged.connect(self.scheduleOverlap)
+
+        # any layer of either job can be browsed, the layers next to the shown one are decoded ahead
+        self.layer_job = QtWidgets.QComboBox(self)
+        self.layer_job.addItems(['base', 'top'])
+        self.layer_job.currentIndexChanged.connect(self.layer_job_changed)
+        self.layer_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal, self)
+        self.layer_slider.setMaximumWidth(200)
+        self.layer_slider.setEnabled(False)
+        self.layer_slider.valueChanged.connect(self.show_layer)
+        self.layer_label = QtWidgets.QLabel(self)
+        self.layer_loader = LayerLoader(ZipFileReader, preview_step=1, parent=self)
+        self.layer_loader.loaded.connect(self.layer_loaded)
+        self.layer_loader.failed.connect(self.load_failed)
         # create a new label widget
         image_label = QtWidgets.QLabel()
         # set the pixmap to the desired image
@@ -693,6 +526,30 @@ class ImageViewer(QtWidgets.QWidget):
         self.editPixInfo = QtWidgets.QLineEdit(self)
         self.editPixInfo.setReadOnly(True)
 
+        # layers are loaded on a worker thread, progress is shown until they are ready
+        self.progress_bar = QtWidgets.QProgressBar(self)
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setMaximumWidth(150)
+        self.progress_bar.hide()
+        self.btn_cancel = QtWidgets.QPushButton(self)
+        self.btn_cancel.setText('cancel')
+        self.btn_cancel.setFlat(True)
+        self.btn_cancel.clicked.connect(self.cancel_loading)
+        self.btn_cancel.hide()
+
+        self.base_loader = LayerLoader(ZipFileReader, parent=self)
+        self.base_loader.progress.connect(self.load_progress)
+        self.base_loader.preview.connect(self.viewer.setPreview)
+        self.base_loader.loaded.connect(self.base_file_loaded)
+        self.base_loader.failed.connect(self.load_failed)
+        self.base_loader.cancelled.connect(self.update_actions)
+        self.viewer.top_loader.progress.connect(self.load_progress)
+        self.viewer.top_loader.loaded.connect(self.load_finished)
+        self.viewer.top_loader.loaded.connect(self.scheduleOverlap)
+        self.viewer.top_loader.loaded.connect(self.layer_job_changed)
+        self.viewer.top_loader.failed.connect(self.load_failed)
+        self.viewer.top_loader.cancelled.connect(self.update_actions)
+
         self.viewer.mousePress.connect(self.mousePress)
         self.viewer.mouseMove.connect(self.mouseMove)
         self.viewer.mouseRelease.connect(self.mouseRelease)
@@ -705,15 +562,23 @@ class ImageViewer(QtWidgets.QWidget):
         
         Toollayout.addWidget(self.btn_fitIn)
         Toollayout.addWidget(self.btn_grid)
-        # Toollayout.addWidget(self.btn_drop)
+        Toollayout.addWidget(self.btn_drop)
+        Toollayout.addWidget(self.btn_overlap)
         Toollayout.addWidget(self.btn_ruler)
         Toollayout.addWidget(self.base_file_button)
         Toollayout.addWidget(self.load_top_file_button)
+        Toollayout.addWidget(self.auto_align_button)
+        Toollayout.addWidget(self.feature_align_button)
         Toollayout.addWidget(self.update_button)
         Toollayout.addWidget(image_label)
 
         HBlayout.addLayout(Toollayout)
+        HBlayout.addWidget(self.layer_job)
+        HBlayout.addWidget(self.layer_slider)
+        HBlayout.addWidget(self.layer_label)
         HBlayout.addWidget(self.editPixInfo)
+        HBlayout.addWidget(self.progress_bar)
+        HBlayout.addWidget(self.btn_cancel)
         VBlayout.addLayout(HBlayout)
         VBlayout.addWidget(self.viewer)
         VBlayout.setContentsMargins(0, -1, -1, -1)
@@ -726,9 +591,48 @@ class ImageViewer(QtWidgets.QWidget):
         dialog.setFileMode(QtWidgets.QFileDialog.ExistingFiles)
         if dialog.exec_() == QtWidgets.QFileDialog.Accepted:
             file_paths = dialog.selectedFiles()
-            self.file_reader = ZipFileReader(file_paths[0])
-            self.print_start_pos, self.group_start_pos = self.file_reader.read_values()
-            self.viewer.setNewPhoto(self.file_reader.read_last_image())
+            self.base_loader.load(file_paths[0], 'last')
+            # the previous job is no longer the one shown once the preview arrives
+            self.file_reader = None
+            self.layer_job_changed()
+            self.update_actions()
+
+    def base_file_loaded(self, reader, image):
+        self.file_reader = reader
+        self.print_start_pos, self.group_start_pos = self.file_reader.read_values()
+        self.viewer.setNewPhoto(image)
+        self.overlap = None
+        self.load_finished()
+        self.scheduleOverlap()
+        self.layer_job_changed()
+
+    def load_progress(self, percent, text):
+        self.progress_bar.setValue(percent)
+        self.progress_bar.show()
+        self.btn_cancel.show()
+        self.editPixInfo.setText(text)
+
+    def load_finished(self, *args):
+        if not self.base_loader.isLoading() and not self.viewer.top_loader.isLoading():
+            self.progress_bar.hide()
+            self.btn_cancel.hide()
+        self.update_actions()
+
+    def load_failed(self, message):
+        self.load_finished()
+        self.editPixInfo.setText('loading failed: ' + message)
+
+    def cancel_loading(self):
+        self.base_loader.cancel()
+        self.viewer.top_loader.cancel()
+        self.load_finished()
+        self.editPixInfo.setText('loading cancelled')
+
+    def closeEvent(self, event):
+        self.base_loader.cancel()
+        self.viewer.top_loader.cancel()
+        self.layer_loader.shutdown()
+        super(ImageViewer, self).closeEvent(event)
 
 ###########################################################
 
@@ -738,14 +642,91 @@ class ImageViewer(QtWidgets.QWidget):
         file_name, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Open file you want to align", "", "Images (*.pcbjc);;All Files (*)", options=options)
         if file_name:
             self.viewer.load_top_file(file_name)
+            self.layer_job_changed()
+            self.update_actions()
+
+    def jobs_loaded(self):
+        """
+        Check whether both jobs are fully loaded, a preview still points at the previous reader or at none.
+        """
+        return self.viewer.top_image_item is not None and self.viewer.hasPhoto() \
+            and getattr(self, 'file_reader', None) is not None and getattr(self.viewer, 'zip_reader', None) is not None \
+            and not self.base_loader.isLoading() and not self.viewer.top_loader.isLoading()
+
+    def update_actions(self, *args):
+        """
+        Enable the start position update and the alignments only while both jobs are fully loaded.
+        """
+        ready = self.jobs_loaded()
+        for button in (self.update_button, self.auto_align_button, self.feature_align_button):
+            button.setEnabled(ready)
+
+    def alignment_ready(self):
+        if not self.jobs_loaded():
+            self.editPixInfo.setText('load a base file and a top file before aligning')
+            return False
+        return True
+
+    def apply_alignment(self, text, dx, dy, confidence, min_confidence):
+        """
+        Move the top image to an alignment result.
+
+        A confident result goes straight on to update the start positions, otherwise the
+        top image is only moved so the user can check it and press 'Update SP'.
+        """
+        self.viewer.top_image_item.setPos(dx, dy)
+        self.scheduleOverlap()
+        if confidence < min_confidence:
+            self.editPixInfo.setText('%s, low confidence %.2f, check the overlay' % (text, confidence))
+            return
+        self.editPixInfo.setText('%s, confidence %.2f' % (text, confidence))
+        self.update()
+
+    def auto_align_top_file(self):
+        """
+        Move the top image onto the base image by phase correlation of the two layers.
+        """
+        if not self.alignment_ready():
+            return
+        QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            dx, dy, confidence = auto_align(self.viewer._photo.codes(), self.viewer.top_image_item.codes())
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        self.apply_alignment('Auto align: offset %.2f,%.2f pixel' % (dx, dy), dx, dy, confidence,
+                             AUTO_ALIGN_MIN_CONFIDENCE)
+
+    def feature_align_top_file(self):
+        """
+        Move the top image onto the base image by matching blobs, pads and corners of the two layers.
+
+        Only the translation is applied, the start position has no rotation, the angle
+        found is shown for information.
+        """
+        if not self.alignment_ready():
+            return
+        QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            result = match_features(self.file_reader.read_layer_features(),
+                                    self.viewer.zip_reader.read_layer_features())
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        if result is None:
+            self.editPixInfo.setText('Feature align: no matching features found')
+            return
+        dx, dy, angle, confidence = result
+        self.apply_alignment('Feature align: offset %.2f,%.2f pixel, rotation %.3f deg' % (dx, dy, angle),
+                             dx, dy, confidence, FEATURE_ALIGN_MIN_CONFIDENCE)
 
     def update(self):
+        if not self.alignment_ready():
+            return
         if self.viewer.top_image_item is not None:
             # Get the current position of the left top corner of the top image
             left_top_x, left_top_y = self.viewer.top_image_item.pos().x(), self.viewer.top_image_item.pos().y()
             rect = self.viewer.top_image_item.boundingRect()
             left_botom_x, left_botom_y = left_top_x, left_top_y + rect.height()
-            x,y = 0, self.viewer._photo.pixmap().height()
+            x,y = 0, self.viewer.photoRect().height()
             pixels_change_x = abs(left_botom_x - x)
             pixels_change_y = abs(left_botom_y - y)
             # Set the new position for the top image
@@ -760,13 +741,22 @@ class ImageViewer(QtWidgets.QWidget):
         new_x = current_x + pixels_change_x*0.036
         new_y = current_y + pixels_change_y*0.03525
 
-        #update position of the top file.
-        self.viewer.zip_reader.update_start_pos(new_x, new_y)
-        z_pos_for_new_file = self.file_reader.get_height()
-        self.viewer.zip_reader.update_z_start_pos(z_pos_for_new_file)
-
-        output_text = f"Updating start position to ({new_x}, {new_y}) based on a pixel change of ({pixels_change_x}, {pixels_change_y}) and set the Z start position to {z_pos_for_new_file} "
+        # the loads and prefetches read through these readers, they must be done before the archives are written
+        for loader in (self.base_loader, self.viewer.top_loader, self.layer_loader):
+            loader.finish()
+        #update position of the top file, written once with its Z start.
+        top_reader = self.viewer.zip_reader
+        saves, bytes_written = top_reader.saves + self.file_reader.saves, top_reader.bytes_written + self.file_reader.bytes_written
+        with top_reader.transaction():
+            top_reader.update_start_pos(new_x, new_y)
+            z_pos_for_new_file = self.file_reader.get_height()
+            top_reader.update_z_start_pos(z_pos_for_new_file)
         self.file_reader.update_start_pos(new_x, new_y)
+        saves = top_reader.saves + self.file_reader.saves - saves
+        bytes_written = top_reader.bytes_written + self.file_reader.bytes_written - bytes_written
+
+        output_text = f"Updating start position to ({new_x}, {new_y}) based on a pixel change of ({pixels_change_x}, {pixels_change_y}) and set the Z start position to {z_pos_for_new_file} " \
+                      f"({saves} archives written, {bytes_written / (1024 * 1024):.1f} MB)"
         output_dialog = OutputDialog(output_text=output_text)
         output_dialog.exec_()
         # pass
@@ -788,9 +778,99 @@ class ImageViewer(QtWidgets.QWidget):
             self.x_mousePress,self.y_mousePress = pos.x(), pos.y()
 
     def drawDrop(self):
-        self.viewer.drawDrop()
+        self.viewer.showDrops(self.btn_drop.isChecked())
+
+    def layer_reader(self):
+        """
+        The reader of the job picked for browsing, None if that job is not loaded.
+        """
+        if self.layer_job.currentIndex() == 0:
+            return getattr(self, 'file_reader', None)
+        return getattr(self.viewer, 'zip_reader', None)
+
+    def layer_job_changed(self, *args):
+        """
+        Point the layer slider at the job picked for browsing, on the layer it shows.
+        """
+        reader = self.layer_reader()
+        self.layer_slider.blockSignals(True)
+        if reader is None:
+            self.layer_slider.setEnabled(False)
+            self.layer_label.setText('')
+        else:
+            self.layer_slider.setEnabled(True)
+            self.layer_slider.setRange(0, reader.archive.layer_count - 1)
+            self.layer_slider.setValue(reader.layer_index or 0)
+            self.layer_label.setText('layer %d / %d' % (self.layer_slider.value() + 1, reader.archive.layer_count))
+        self.layer_slider.blockSignals(False)
+
+    def show_layer(self, layer_index):
+        reader = self.layer_reader()
+        if reader is None:
+            return
+        self.layer_label.setText('layer %d / %d' % (layer_index + 1, reader.archive.layer_count))
+        self.layer_loader.load(reader.file_path, layer_index, reader)
+
+    def layer_loaded(self, reader, image):
+        """
+        Show a layer picked with the layer slider and decode its neighbours ahead.
+        """
+        if reader is getattr(self, 'file_reader', None):
+            self.viewer.setPhoto(image)
+            self.viewer.updateDrops()
+        elif reader is getattr(self.viewer, 'zip_reader', None):
+            self.viewer.show_top_image(image)
+        else:
+            # the job was replaced while the layer was loading
+            return
+        self.scheduleOverlap()
+        layer_index, layer_count = reader.layer_index, reader.archive.layer_count
+        self.layer_loader.prefetch(reader, [index for index in (layer_index + 1, layer_index - 1)
+                                            if 0 <= index < layer_count])
+
+    def toggleOverlap(self):
+        if not self.btn_overlap.isChecked():
+            self.viewer.setHeatmap(None)
+            self.editPixInfo.setText('')
+        self.scheduleOverlap()
+
+    def scheduleOverlap(self, *args):
+        """
+        Refresh the overlap analysis once the pending events are handled.
+
+        A moved top image is only analyzed again once it rests for OVERLAP_SETTLE_MS, so a
+        drag re-analyzes the tiles the top layer reaches once instead of at every step.
+        Scrolling and zooming reuse the tiles of the current offset and refresh at once.
+        """
+        if not self.btn_overlap.isChecked():
+            return
+        top_item = self.viewer.top_image_item
+        moved = self.overlap is not None and top_item is not None \
+            and self.overlap.moves(top_item.pos().x(), top_item.pos().y())
+        self._overlapTimer.start(OVERLAP_SETTLE_MS if moved else 0)
+
+    def refreshOverlap(self):
+        """
+        Analyze the overlap of the visible region and show its heatmap.
+        """
+        top_item = self.viewer.top_image_item
+        if not self.btn_overlap.isChecked() or top_item is None or top_item.isNull() or not self.viewer.hasPhoto() \
+                or top_item.isPreview() or self.viewer._photo.isPreview():
+            self.viewer.setHeatmap(None)
+            return
+        base_codes, top_codes = self.viewer._photo.codes(), top_item.codes()
+        if self.overlap is None or self.overlap.base is not base_codes or self.overlap.top is not top_codes:
+            self.overlap = OverlapAnalysis(base_codes, top_codes)
+        self.overlap.setOffset(top_item.pos().x(), top_item.pos().y())
+        visible = self.viewer.mapToScene(self.viewer.viewport().rect()).boundingRect()
+        region = int(visible.left()), int(visible.top()), int(visible.right()), int(visible.bottom())
+        stats = self.overlap.analyze(*region)
+        image, x, y = self.overlap.heatmap(*region)
+        self.viewer.setHeatmap(image, x, y, self.overlap.block)
+        self.editPixInfo.setText(stats.summary())
 
     def mouseMove(self, pos):
+        self.scheduleOverlap()
         if self.viewer.dragMode()  == QtWidgets.QGraphicsView.NoDrag:
             if self.mousePressd == True:
                 self.viewer._RulerLine.draw()
@@ -803,6 +883,7 @@ class ImageViewer(QtWidgets.QWidget):
         self.mousePressd = False
             
     def wheel(self):
+        self.scheduleOverlap()
         if self.viewer.getScaleFactor() >25 and self.viewer.ResolutionInUM_PrintAxis != 36:
             self.btn_drop.setDisabled(False)
         else:
@@ -835,29 +916,59 @@ class ImageOverlap(Viewer):
     def __init__(self, parent=None):
         super(ImageOverlap, self).__init__(parent)
         self.top_image_item = None
+        self.top_loader = LayerLoader(ZipFileReader, parent=self)
+        self.top_loader.preview.connect(self.top_file_preview)
+        self.top_loader.loaded.connect(self.top_file_loaded)
+        self.heatmap_item = QtWidgets.QGraphicsPixmapItem()
+        self.heatmap_item.setZValue(1.5)
+        self.heatmap_item.hide()
+        self.scene().addItem(self.heatmap_item)
+
+    def setHeatmap(self, image, x=0, y=0, scale=1):
+        """
+        Show an overlap heatmap over the layers, see OverlapAnalysis.heatmap.
 
-
-
+        Args:
+            image (QImage): One pixel per heatmap cell, None or a null image to hide the heatmap.
+            x (int): Scene position of the left edge of the heatmap.
+            y (int): Scene position of the top edge of the heatmap.
+            scale (int): Size of a heatmap cell in scene pixels.
+        """
+        if image is None or image.isNull():
+            self.heatmap_item.hide()
+            return
+        self.heatmap_item.setPixmap(QtGui.QPixmap.fromImage(image))
+        self.heatmap_item.setPos(x, y)
+        self.heatmap_item.setScale(scale)
+        self.heatmap_item.show()
 
     def load_top_file(self, file_path):
         if self.top_image_item is not None:
             self.scene().removeItem(self.top_image_item)
-
-        # Create a ZipFileReader object to read the image data
-        self.zip_reader = ZipFileReader(file_path)
-
-        # Read the last image in the zip file
-        self.pixmap = self.zip_reader.read_first_image()
-        # Change the color of the white pixels
-        # green = QtGui.QColor(0, 255, 0, 255)
-
-
-        self.top_image_item = QtWidgets.QGraphicsPixmapItem(self.pixmap)
-        self.top_image_item.setFlag(QtWidgets.QGraphicsItem.ItemIsMovable, True)
-        self.top_image_item.setFlag(QtWidgets.QGraphicsItem.ItemIsSelectable, True)
-        self.top_image_item.setZValue(1)
-        self.top_image_item.setOpacity(0.5)
-        self.scene().addItem(self.top_image_item)
+            self.top_image_item = None
+
+        # Read the first image of the zip file on a worker thread
+        self.top_loader.load(file_path, 'first')
+        self.zip_reader = None
+
+    def top_file_preview(self, image, width, height):
+        self.show_top_image(image, QtCore.QSizeF(width, height))
+
+    def top_file_loaded(self, reader, image):
+        self.zip_reader = reader
+        self.show_top_image(image)
+
+    def show_top_image(self, image, size=None):
+        if self.top_image_item is None:
+            self.top_image_item = TiledImageItem()
+            self.top_image_item.setImage(image, size)
+            self.top_image_item.setFlag(QtWidgets.QGraphicsItem.ItemIsMovable, True)
+            self.top_image_item.setFlag(QtWidgets.QGraphicsItem.ItemIsSelectable, True)
+            self.top_image_item.setZValue(1)
+            self.top_image_item.setOpacity(0.5)
+            self.scene().addItem(self.top_image_item)
+        else:
+            self.top_image_item.setImage(image, size)
 
 
 if __name__ == '__main__':
@@ -6,10 +6,10 @@ block_cipher = None
 
 a = Analysis(
     ['main.py'],
-    pathex=[],
+    pathex=['../common'],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['scipy.ndimage', 'scipy.spatial', 'scipy.spatial._ckdtree'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,288 @@
+import numpy as np
+from scipy import ndimage
+from PyQt5 import QtGui
+from imaging import array_to_qimage
+
+
+# name and code bit of each separation, see imaging.layer_codes
+SEPARATIONS = (('CI', 1), ('DI', 2))
+# columns of OverlapStats.counts
+BOTH, ONLY_ONE, BASE, TOP = range(4)
+
+
+def _crop(codes, left, top, width, height):
+    """
+    Cut a window with its top left corner at (left, top) out of layer codes, empty outside the layer.
+    """
+    window = np.zeros((height, width), dtype=np.uint8)
+    rows, columns = codes.shape
+    y0, x0 = max(top, 0), max(left, 0)
+    y1, x1 = min(top + height, rows), min(left + width, columns)
+    if y0 < y1 and x0 < x1:
+        window[y0 - top:y1 - top, x0 - left:x1 - left] = codes[y0:y1, x0:x1]
+    return window
+
+
+class OverlapStats:
+    """
+    Overlap of the base and top layers over a region, summed over the tiles it covers.
+
+    Attributes:
+        counts (numpy.ndarray): int64 array of shape (2, 4). For the CI and DI separations,
+            the number of pixels printed by both layers (BOTH), by only one of them
+            (ONLY_ONE), by the base (BASE) and by the top (TOP).
+        histogram (numpy.ndarray): int64 array of shape (2, max_distance + 1). For each
+            separation, the number of top pixels at each distance in pixels from the
+            closest base pixel, the last bin holding all the larger distances.
+        tiles (int): Number of tiles summed.
+    """
+
+    def __init__(self, max_distance):
+        self.counts = np.zeros((len(SEPARATIONS), 4), dtype=np.int64)
+        self.histogram = np.zeros((len(SEPARATIONS), max_distance + 1), dtype=np.int64)
+        self.tiles = 0
+
+    def overlap_percent(self, separation):
+        """
+        Pixels printed by both layers, in percent of the pixels printed by either.
+        """
+        union = self.counts[separation, BOTH] + self.counts[separation, ONLY_ONE]
+        return 100.0 * self.counts[separation, BOTH] / union if union else 0.0
+
+    def distance_percentile(self, separation, percent):
+        """
+        Misregistration distance in pixels that percent of the top pixels of a separation stay within.
+        """
+        cumulative = np.cumsum(self.histogram[separation])
+        if not cumulative[-1]:
+            return 0
+        return int(np.searchsorted(cumulative, cumulative[-1] * percent / 100.0))
+
+    def summary(self):
+        """
+        One line describing the overlap of each separation, for the status line.
+        """
+        parts = []
+        for separation, (name, _) in enumerate(SEPARATIONS):
+            if not self.counts[separation, BASE] and not self.counts[separation, TOP]:
+                continue
+            parts.append('%s overlap %.1f%%, xor %.1f%%, misregistration p50 %d px p95 %d px'
+                         % (name, self.overlap_percent(separation), 100.0 - self.overlap_percent(separation),
+                            self.distance_percentile(separation, 50), self.distance_percentile(separation, 95)))
+        return ' | '.join(parts) or 'nothing printed in the analyzed region'
+
+
+class OverlapAnalysis:
+    """
+    Compare the top layer with the base layer at an integer offset, tile by tile.
+
+    The base layer is cut into tile_size x tile_size tiles. For each tile the XOR and AND
+    of the two layers are counted per separation, and the distance of every top pixel to
+    the closest base pixel of the same separation is taken from a distance transform of
+    the base. Tile results are cached for the current offset, so scrolling and zooming only
+    computes the tiles that are new to the visible region. Moving the top layer drops them,
+    except for the tiles the printed part of the top layer does not reach: their result
+    only depends on the base and is kept for good, like the distance transforms. Top pixels
+    outside the base layer are not counted.
+    """
+
+    def __init__(self, base_codes, top_codes, tile_size=256, block=8, max_distance=32):
+        """
+        Args:
+            base_codes (numpy.ndarray): Layer codes of the base job's last layer.
+            top_codes (numpy.ndarray): Layer codes of the top job's first layer.
+            tile_size (int): Size of the tiles in pixels, a multiple of block.
+            block (int): Size in pixels of one heatmap cell.
+            max_distance (int): Largest misregistration distance told apart, in pixels.
+        """
+        self.base = base_codes
+        self.top = top_codes
+        self.tile_size = tile_size
+        self.block = block
+        self.max_distance = max_distance
+        self.offset = None
+        self._distances = {}
+        self._tiles = {}
+        self._base_tiles = {}
+        self._top_box = None
+
+    def moves(self, dx, dy):
+        """
+        Check whether setOffset(dx, dy) would change the offset.
+        """
+        return (int(round(dx)), int(round(dy))) != self.offset
+
+    def setOffset(self, dx, dy):
+        """
+        Move the top layer so its top left corner is at (dx, dy) on the base, rounded to whole pixels.
+
+        Returns:
+            bool: True if the offset changed and the tile results that depend on it were dropped.
+        """
+        offset = int(round(dx)), int(round(dy))
+        if offset == self.offset:
+            return False
+        self.offset = offset
+        self._tiles.clear()
+        return True
+
+    def tileRange(self, left=0, top=0, right=None, bottom=None):
+        """
+        Rows and columns of the tiles that cover a region of the base layer, clipped to the layer.
+
+        Args:
+            left, top, right, bottom (int): The region in base pixels, right and bottom
+                included. The whole layer by default.
+
+        Returns:
+            tuple: (range of rows, range of columns).
+        """
+        height, width = self.base.shape
+        right = width - 1 if right is None else min(right, width - 1)
+        bottom = height - 1 if bottom is None else min(bottom, height - 1)
+        left, top = max(left, 0), max(top, 0)
+        if left > right or top > bottom:
+            return range(0), range(0)
+        size = self.tile_size
+        return range(top // size, bottom // size + 1), range(left // size, right // size + 1)
+
+    def _distance_tile(self, row, column):
+        """
+        Distances of the pixels of a tile to the closest base pixel of each separation, capped at max_distance.
+
+        The transform runs on the tile grown by max_distance on every side, which is
+        enough for every distance up to the cap to be exact.
+        """
+        key = row, column
+        distances = self._distances.get(key)
+        if distances is not None:
+            return distances
+        size, margin = self.tile_size, self.max_distance
+        window = _crop(self.base, column * size - margin, row * size - margin, size + 2 * margin, size + 2 * margin)
+        distances = np.full((len(SEPARATIONS), size, size), margin, dtype=np.uint8)
+        for separation, (_, bit) in enumerate(SEPARATIONS):
+            background = (window & bit) == 0
+            if background.all():
+                continue
+            transform = ndimage.distance_transform_edt(background)[margin:margin + size, margin:margin + size]
+            np.minimum(np.rint(transform), margin, out=transform)
+            distances[separation] = transform
+        self._distances[key] = distances
+        return distances
+
+    def _reachesTop(self, row, column):
+        """
+        Check whether the printed part of the top layer, at the current offset, overlaps a tile.
+        """
+        if self._top_box is None:
+            printed = self.top != 0
+            rows, columns = np.flatnonzero(printed.any(axis=1)), np.flatnonzero(printed.any(axis=0))
+            # (left, top, right, bottom) of the printed pixels, right and bottom excluded
+            self._top_box = (columns[0], rows[0], columns[-1] + 1, rows[-1] + 1) if len(rows) else (0, 0, 0, 0)
+        box_left, box_top, box_right, box_bottom = self._top_box
+        if box_left == box_right:
+            return False
+        size = self.tile_size
+        left, top = column * size - self.offset[0], row * size - self.offset[1]
+        return left < box_right and box_left < left + size and top < box_bottom and box_top < top + size
+
+    def _tile(self, row, column):
+        """
+        Counts, distance histogram and heatmap cells of one tile at the current offset.
+        """
+        key = row, column
+        result = self._tiles.get(key)
+        if result is not None:
+            return result
+        reaches = self._reachesTop(row, column)
+        if not reaches:
+            result = self._base_tiles.get(key)
+            if result is not None:
+                return result
+        size, block = self.tile_size, self.block
+        left, top = column * size, row * size
+        base = _crop(self.base, left, top, size, size)
+        if reaches:
+            moved = _crop(self.top, left - self.offset[0], top - self.offset[1], size, size)
+        else:
+            moved = np.zeros((size, size), dtype=np.uint8)
+        # the top is only compared where the base layer is
+        moved[min(self.base.shape[0] - top, size):] = 0
+        moved[:, min(self.base.shape[1] - left, size):] = 0
+
+        both, only_one = base & moved, base ^ moved
+        counts = np.empty((len(SEPARATIONS), 4), dtype=np.int64)
+        histogram = np.zeros((len(SEPARATIONS), self.max_distance + 1), dtype=np.int64)
+        for separation, (_, bit) in enumerate(SEPARATIONS):
+            top_pixels = (moved & bit) != 0
+            counts[separation] = (np.count_nonzero(both & bit), np.count_nonzero(only_one & bit),
+                                  np.count_nonzero(base & bit), np.count_nonzero(top_pixels))
+            if counts[separation, TOP]:
+                distances = self._distance_tile(row, column)[separation]
+                histogram[separation] = np.bincount(distances[top_pixels], minlength=self.max_distance + 1)
+
+        # part of each heatmap cell printed by one layer only and by both, any separation
+        cells = size // block, block, size // block, block
+        xor = (only_one != 0).reshape(cells).sum(axis=(1, 3), dtype=np.int32)
+        agree = (both != 0).reshape(cells).sum(axis=(1, 3), dtype=np.int32)
+        result = counts, histogram, xor, agree
+        if reaches:
+            self._tiles[key] = result
+        else:
+            self._base_tiles[key] = result
+        return result
+
+    def analyze(self, left=0, top=0, right=None, bottom=None):
+        """
+        Sum the overlap of the tiles covering a region of the base layer.
+
+        Args:
+            left, top, right, bottom (int): The region in base pixels, see tileRange.
+
+        Returns:
+            OverlapStats: The counts and the misregistration histogram of the region.
+        """
+        stats = OverlapStats(self.max_distance)
+        if self.offset is None:
+            return stats
+        rows, columns = self.tileRange(left, top, right, bottom)
+        for row in rows:
+            for column in columns:
+                counts, histogram, _, _ = self._tile(row, column)
+                stats.counts += counts
+                stats.histogram += histogram
+                stats.tiles += 1
+        return stats
+
+    def heatmap(self, left=0, top=0, right=None, bottom=None):
+        """
+        Color the heatmap cells of the tiles covering a region of the base layer.
+
+        Cells get more red the more of their pixels only one layer prints and more green
+        the more both print, cells where nothing prints are transparent.
+
+        Args:
+            left, top, right, bottom (int): The region in base pixels, see tileRange.
+
+        Returns:
+            tuple: (image, x, y), an ARGB32 QImage with one pixel per cell, and the base
+            pixel position of its top left corner. The image is null if the region is empty.
+        """
+        rows, columns = self.tileRange(left, top, right, bottom)
+        if self.offset is None or not len(rows) or not len(columns):
+            return QtGui.QImage(), 0, 0
+        cells = self.tile_size // self.block
+        xor = np.zeros((len(rows) * cells, len(columns) * cells), dtype=np.int32)
+        agree = np.zeros_like(xor)
+        for y, row in enumerate(rows):
+            for x, column in enumerate(columns):
+                _, _, tile_xor, tile_agree = self._tile(row, column)
+                xor[y * cells:(y + 1) * cells, x * cells:(x + 1) * cells] = tile_xor
+                agree[y * cells:(y + 1) * cells, x * cells:(x + 1) * cells] = tile_agree
+        scale = 255 // (self.block * self.block) + 1
+        red = np.minimum(xor * scale, 255).astype(np.uint32)
+        green = np.minimum(agree * scale, 255).astype(np.uint32)
+        alpha = np.where((red | green) != 0, 160, 0).astype(np.uint32)
+        pixels = alpha << 24 | red << 16 | green << 8
+        image = array_to_qimage(pixels, QtGui.QImage.Format_ARGB32)
+        return image, columns[0] * self.tile_size, rows[0] * self.tile_size
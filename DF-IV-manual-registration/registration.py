@@ -0,0 +1,148 @@
+import numpy as np
+
+
+COARSE_STEP = 16
+REFINE_STEPS = (4, 1)
+WINDOW_SIZE = 1024
+
+
+def _block_mean(mask, step):
+    """
+    Shrink a boolean mask by an integer factor, each pixel of the result is the coverage of its block.
+
+    Blocks cut by the right and bottom edges count the missing pixels as empty.
+    """
+    height, width = mask.shape
+    sums = np.add.reduceat(mask.view(np.uint8), np.arange(0, width, step), axis=1, dtype=np.uint16)
+    sums = np.add.reduceat(sums, np.arange(0, height, step), axis=0, dtype=np.uint16)
+    return sums.astype(np.float32) / (step * step)
+
+
+def _pad_to(array, shape):
+    padded = np.zeros(shape, dtype=np.float32)
+    padded[:array.shape[0], :array.shape[1]] = array
+    return padded
+
+
+def _subpixel(surface, index, axis):
+    """
+    Refine the peak position along one axis from the larger of its two neighbours.
+
+    The phase correlation peak of a fractional shift is a sampled sinc, for which the ratio
+    of the neighbour to the peak gives the fraction (Foroosh et al., 2002).
+    """
+    size = surface.shape[axis]
+    before, after = list(index), list(index)
+    before[axis] = (index[axis] - 1) % size
+    after[axis] = (index[axis] + 1) % size
+    left, center, right = surface[tuple(before)], surface[tuple(index)], surface[tuple(after)]
+    if right >= left and right > 0:
+        return float(right / (right + center))
+    if left > 0:
+        return float(-left / (left + center))
+    return 0.0
+
+
+def phase_correlate(reference, moving, subpixel=False):
+    """
+    Find the translation between two images of the same shape with FFT phase correlation.
+
+    Args:
+        reference (numpy.ndarray): 2D float array.
+        moving (numpy.ndarray): 2D float array of the same shape.
+        subpixel (bool): Refine the peak position with the sinc neighbour ratio of _subpixel.
+
+    Returns:
+        tuple: (dx, dy, peak). Shifting moving by (dx, dy) lines it up with reference. The
+        peak is the height of the correlation peak, 1 for a perfect match and close to 0
+        when the images are unrelated.
+    """
+    cross_power = np.fft.rfft2(reference) * np.conj(np.fft.rfft2(moving))
+    magnitude = np.abs(cross_power)
+    cross_power /= np.where(magnitude > 1e-12, magnitude, 1)
+    surface = np.fft.irfft2(cross_power, s=reference.shape)
+    index = np.unravel_index(np.argmax(surface), surface.shape)
+    shift = []
+    for axis in (1, 0):
+        offset = index[axis] + (_subpixel(surface, index, axis) if subpixel else 0.0)
+        # peaks past the middle are negative shifts wrapped around
+        if offset > surface.shape[axis] / 2:
+            offset -= surface.shape[axis]
+        shift.append(offset)
+    return shift[0], shift[1], float(surface[index])
+
+
+def _window_center(reference, moving, dx, dy, window):
+    """
+    Pick the center of the window with the most shared edges once moving is shifted by (dx, dy).
+    """
+    gradient_reference = np.abs(np.diff(reference, axis=0, append=0)) + np.abs(np.diff(reference, axis=1, append=0))
+    gradient_moving = np.abs(np.diff(moving, axis=0, append=0)) + np.abs(np.diff(moving, axis=1, append=0))
+    activity = gradient_reference * np.roll(gradient_moving, (int(round(dy)), int(round(dx))), axis=(0, 1))
+    # box sums of window x window through a summed area table
+    table = np.pad(activity.cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+    height, width = activity.shape
+    size_y, size_x = min(window, height), min(window, width)
+    sums = (table[size_y:, size_x:] - table[:-size_y, size_x:]
+            - table[size_y:, :-size_x] + table[:-size_y, :-size_x])
+    row, column = np.unravel_index(np.argmax(sums), sums.shape)
+    return column + size_x / 2, row + size_y / 2
+
+
+def _crop(mask, x, y, size):
+    """
+    Crop a size x size window with its top left corner at (x, y), empty outside the mask.
+    """
+    window = np.zeros((size, size), dtype=mask.dtype)
+    height, width = mask.shape
+    top, left = max(y, 0), max(x, 0)
+    bottom, right = min(y + size, height), min(x + size, width)
+    if top < bottom and left < right:
+        window[top - y:bottom - y, left - x:right - x] = mask[top:bottom, left:right]
+    return window
+
+
+def auto_align(base_codes, top_codes, coarse_step=COARSE_STEP, refine_steps=REFINE_STEPS, window=WINDOW_SIZE):
+    """
+    Find the position of the top layer that lines it up with the base layer.
+
+    The whole layers are phase correlated at 1/coarse_step resolution first. The offset
+    is then refined on a window of window x window pixels at each of the refine steps,
+    placed where the two layers share the most edges, and the last step is resolved to
+    a fraction of a pixel.
+
+    Args:
+        base_codes (numpy.ndarray): Layer codes of the base job's last layer.
+        top_codes (numpy.ndarray): Layer codes of the top job's first layer.
+        coarse_step (int): Reduction factor of the coarse search.
+        refine_steps (tuple): Reduction factors of the refinement, ending with 1.
+        window (int): Size of the refinement window in pixels of each step.
+
+    Returns:
+        tuple: (dx, dy, confidence). (dx, dy) is the scene position of the top left corner
+        of the top layer, the confidence is the correlation peak of the last step, from 0
+        to 1.
+    """
+    base_mask = base_codes != 0
+    top_mask = top_codes != 0
+
+    base_coarse = _block_mean(base_mask, coarse_step)
+    top_coarse = _block_mean(top_mask, coarse_step)
+    shape = max(base_coarse.shape[0], top_coarse.shape[0]), max(base_coarse.shape[1], top_coarse.shape[1])
+    base_coarse, top_coarse = _pad_to(base_coarse, shape), _pad_to(top_coarse, shape)
+    dx, dy, confidence = phase_correlate(base_coarse, top_coarse)
+    center_x, center_y = _window_center(base_coarse, top_coarse, dx, dy, window // coarse_step)
+    dx, dy = dx * coarse_step, dy * coarse_step
+    center_x, center_y = center_x * coarse_step, center_y * coarse_step
+
+    for step in refine_steps:
+        # the windows are cut at full resolution and reduced afterwards
+        size = window * step
+        left = int(round(center_x - size / 2))
+        top = int(round(center_y - size / 2))
+        offset_x, offset_y = int(round(dx)), int(round(dy))
+        base_window = _block_mean(_crop(base_mask, left, top, size), step)
+        top_window = _block_mean(_crop(top_mask, left - offset_x, top - offset_y, size), step)
+        residual_x, residual_y, confidence = phase_correlate(base_window, top_window, subpixel=step == 1)
+        dx, dy = offset_x + residual_x * step, offset_y + residual_y * step
+    return float(dx), float(dy), confidence
@@ -0,0 +1,194 @@
+# Imports
+import argparse
+import concurrent.futures
+import sys
+import time
+from job_reader import ZipFileReader
+from registration import auto_align
+from features import match_features
+
+
+# millimeters per pixel along x (GroupAxis) and y (PrintAxis), the pitches of the manual alignment
+_PIXEL_SIZE_MM = (0.036, 0.03525)
+MIN_CONFIDENCE = {'phase': 0.2, 'features': 0.3}
+
+
+def register_pair(base, top, method='phase'):
+    """
+    Register the first layer of a job against the last layer of the job below it.
+
+    Args:
+        base (ZipFileReader): The job below.
+        top (ZipFileReader): The job printed on top of it.
+        method (str): 'phase' for registration.auto_align, 'features' for features.match_features.
+
+    Returns:
+        tuple: (dx, dy, confidence), the pixel position of the top left corner of the top
+        layer over the base layer. None if the features could not be matched.
+    """
+    base_layer = base.archive.layer_count - 2
+    if method == 'features':
+        result = match_features(base.read_layer_features(base_layer), top.read_layer_features(0))
+        if result is None:
+            return None
+        dx, dy, _, confidence = result
+        return dx, dy, confidence
+    return auto_align(base.read_layer_codes(base_layer), top.read_layer_codes(0))
+
+
+def plan_stack(readers, method='phase', workers=None):
+    """
+    Register every job against the previous one and chain the start positions.
+
+    The first job keeps its position and Z start. Every following job is placed at the
+    position of the job below plus its registration offset, and starts in Z where the
+    job below ends. The bottom left corners of the layers are compared, like the manual
+    alignment does, and the signed offset is added to the GroupAxis and PrintAxis start.
+    Unlike ImageViewer.set_new_start_position, which adds the absolute pixel change, a
+    job left of or above the one below it moves the other way. Nothing is written.
+
+    Args:
+        readers (list): ZipFileReader of each job, from the bottom of the stack up.
+        method (str): 'phase' or 'features', see register_pair.
+        workers (int): Number of threads registering pairs, by default one per CPU.
+
+    Returns:
+        list: One dictionary per job with 'file', 'offset', 'confidence', 'group',
+        'print' and 'z_start' keys, offset and confidence are None for the first job.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        registrations = list(executor.map(lambda pair: register_pair(pair[0], pair[1], method),
+                                          zip(readers, readers[1:])))
+
+    first = readers[0]
+    group, print_ = first.archive.position
+    z_start = first.info_dict['Layers'][0].get('LayerStartPosZInUM', 0) if first.info_dict['Layers'] else 0
+    plan = [{'file': first.file_path, 'offset': None, 'confidence': None,
+             'group': group, 'print': print_, 'z_start': z_start}]
+    for base, top, registration in zip(readers, readers[1:], registrations):
+        z_start += base.get_height()
+        if registration is None:
+            plan.append({'file': top.file_path, 'offset': None, 'confidence': 0.0,
+                         'group': group, 'print': print_, 'z_start': z_start})
+            continue
+        dx, dy, confidence = registration
+        base_height, top_height = base.read_layer_codes(base.archive.layer_count - 2).shape[0], top.read_layer_codes(0).shape[0]
+        # offset of the bottom left corners, as ImageViewer.update measures it
+        offset_x, offset_y = dx, dy + top_height - base_height
+        group += offset_x * _PIXEL_SIZE_MM[0]
+        print_ += offset_y * _PIXEL_SIZE_MM[1]
+        plan.append({'file': top.file_path, 'offset': (offset_x, offset_y), 'confidence': confidence,
+                     'group': group, 'print': print_, 'z_start': z_start})
+    return plan
+
+
+def apply_stack(readers, plan, workers=None):
+    """
+    Write the planned start positions into the archives, in parallel.
+
+    Args:
+        readers (list): ZipFileReader of each job, in the order of the plan.
+        plan (list): The result of plan_stack.
+        workers (int): Number of threads writing archives, by default one per CPU.
+
+    Returns:
+        list: (file path, seconds spent, bytes written, error message) for each job written,
+        the first job is left as it is.
+    """
+    def write(job):
+        reader, entry = job
+        start = time.perf_counter()
+        try:
+            with reader.transaction():
+                reader.update_start_pos(entry['group'], entry['print'])
+                reader.update_z_start_pos(entry['z_start'])
+            return reader.file_path, time.perf_counter() - start, reader.bytes_written, ''
+        except Exception as exc:
+            return reader.file_path, time.perf_counter() - start, reader.bytes_written, f'{type(exc).__name__}: {exc}'
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(write, zip(readers[1:], plan[1:])))
+
+
+def print_report(plan, min_confidence, written=None):
+    """
+    Print one line per job of a stack plan, and the write results if there are any.
+    """
+    print(f"{'job':<40}{'offset px':>20}{'conf':>7}{'GroupAxis':>11}{'PrintAxis':>11}{'Z start um':>12}")
+    for entry in plan:
+        offset = '' if entry['offset'] is None else '%.2f, %.2f' % entry['offset']
+        confidence = '' if entry['confidence'] is None else '%.2f' % entry['confidence']
+        flag = '  LOW' if entry['confidence'] is not None and entry['confidence'] < min_confidence else ''
+        print(f"{entry['file'][-40:]:<40}{offset:>20}{confidence:>7}{entry['group']:>11.4f}"
+              f"{entry['print']:>11.4f}{entry['z_start']:>12.2f}{flag}")
+    if written is not None:
+        print()
+        failed = [result for result in written if result[3]]
+        total = sum(result[2] for result in written)
+        print(f'{len(written) - len(failed)} archives written ({total / (1024 * 1024):.1f} MB), {len(failed)} failed')
+        for file_path, seconds, bytes_written, error in written:
+            print(f"  {'failed' if error else 'written':<8}{seconds:8.2f}s{bytes_written / (1024 * 1024):8.1f} MB  {file_path}  {error}")
+
+
+def stack_jobs(file_paths, method='phase', dry_run=False, force=False, workers=None):
+    """
+    Register and chain a stack of jobs, then write the new start positions.
+
+    Args:
+        file_paths (list): The .pcbjc files, from the bottom of the stack up.
+        method (str): 'phase' or 'features', see register_pair.
+        dry_run (bool): Only print the report, write nothing.
+        force (bool): Write even if a registration has a low confidence.
+        workers (int): Number of worker threads.
+
+    Returns:
+        int: The exit code, 1 if nothing was written because of a low confidence or a write failed.
+    """
+    start = time.perf_counter()
+    readers = [ZipFileReader(file_path) for file_path in file_paths]
+    try:
+        plan = plan_stack(readers, method, workers)
+        min_confidence = MIN_CONFIDENCE[method]
+        low = [entry for entry in plan[1:] if entry['confidence'] < min_confidence]
+        if dry_run or (low and not force):
+            print_report(plan, min_confidence)
+            print()
+            if dry_run:
+                print(f'dry run, nothing written ({time.perf_counter() - start:.2f}s)')
+                return 0
+            print(f'{len(low)} registrations below confidence {min_confidence}, nothing written (use --force to write anyway)')
+            return 1
+        written = apply_stack(readers, plan, workers)
+        print_report(plan, min_confidence, written)
+        print(f'done in {time.perf_counter() - start:.2f}s')
+        return 1 if any(result[3] for result in written) else 0
+    finally:
+        for reader in readers:
+            reader.archive.close()
+
+
+def main(argv=None):
+    """
+    Command line entry point of the stacking pipeline.
+
+    Args:
+        argv (list): The command line arguments, sys.argv[1:] by default.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description='Register a stack of .pcbjc jobs, each against the one below it, '
+                                                 'and write the chained XY start positions and Z starts.')
+    parser.add_argument('files', nargs='+', help='the .pcbjc files, from the bottom of the stack up')
+    parser.add_argument('--features', action='store_true', help='register with feature matching instead of phase correlation')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='only print the report, write nothing')
+    parser.add_argument('-f', '--force', action='store_true', help='write even if a registration has a low confidence')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker threads (default: one per CPU)')
+    args = parser.parse_args(argv)
+    if len(args.files) < 2:
+        parser.error('at least two jobs are needed to build a stack')
+    return stack_jobs(args.files, 'features' if args.features else 'phase', args.dry_run, args.force, args.workers)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# Imports
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+import numpy as np
+from PyQt5 import QtCore, QtGui, QtWidgets
+import job_reader
+from job_reader import ZipFileReader
+from loader import LayerLoader
+
+
+def bmp_bytes(width, height, seed):
+    """
+    A 1 bit BMP of random squares, stored as the printer stores its separations.
+    """
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_Mono)
+    image.fill(0)
+    painter = QtGui.QPainter(image)
+    cells = np.random.default_rng(seed).random((height // 40, width // 40)) > 0.5
+    for row, column in zip(*np.nonzero(cells)):
+        painter.fillRect(int(column) * 40, int(row) * 40, 25, 25, QtGui.QColor('white'))
+    painter.end()
+    data = QtCore.QByteArray()
+    buffer = QtCore.QBuffer(data)
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    image.save(buffer, 'BMP')
+    return bytes(data)
+
+
+def make_job(file_path, layers=3, width=4000, height=3000):
+    """
+    Write a pcbjc archive with stored CI and DI bitmaps on every layer.
+    """
+    info = {'Recipe': 'Recipe', 'PositionInMM': {'GroupAxis': 10.0, 'PrintAxis': 20.0},
+            'Separations': [{'ResolutionInUM': {'PrintAxis': 36, 'GroupAxis': 35.25}}] * 2,
+            'Layers': [{'LayerStartPosZInUM': 0,
+                        'Separations': [{'File': 'ci%d.bmp' % index, 'LayerThicknessUM': 10},
+                                        {'File': 'di%d.bmp' % index, 'LayerThicknessUM': 10}]}
+                       for index in range(layers)]}
+    with zipfile.ZipFile(file_path, 'w') as archive:
+        archive.writestr('pcbj.info', json.dumps(info), zipfile.ZIP_DEFLATED)
+        for index in range(layers):
+            archive.writestr('ci%d.bmp' % index, bmp_bytes(width, height, index))
+            archive.writestr('di%d.bmp' % index, bmp_bytes(width, height, 100 + index))
+
+
+class SaveDuringLoadTest(unittest.TestCase):
+    """
+    Start positions written while a layer of the same archive is being decoded.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        cls.folder = tempfile.mkdtemp(prefix='DF-IV-registration-test-')
+        cls.job = os.path.join(cls.folder, 'job.pcbjc')
+        make_job(cls.job)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder, ignore_errors=True)
+
+    def setUp(self):
+        job_reader.LAYER_CACHE.clear()
+        self.reader = ZipFileReader(self.job)
+        self.loader = LayerLoader(ZipFileReader, preview_step=1)
+        self.progress, self.loaded, self.failed = [], [], []
+        self.loader.progress.connect(lambda percent, text: self.progress.append(percent))
+        self.loader.loaded.connect(lambda reader, image: self.loaded.append(image))
+        self.loader.failed.connect(self.failed.append)
+
+    def tearDown(self):
+        self.loader.shutdown()
+        QtCore.QThreadPool.globalInstance().waitForDone()
+        self.app.processEvents()
+        self.reader.archive.close()
+
+    def wait_for(self, condition, seconds=60):
+        timer = QtCore.QElapsedTimer()
+        timer.start()
+        while not condition() and timer.elapsed() < seconds * 1000:
+            self.app.processEvents(QtCore.QEventLoop.AllEvents, 10)
+        return condition()
+
+    def test_save_while_a_load_is_in_flight(self):
+        self.loader.load(self.job, 1, self.reader)
+        self.assertTrue(self.wait_for(lambda: self.progress))
+        self.assertTrue(self.loader.isLoading())
+
+        self.loader.finish()
+        with self.reader.transaction():
+            self.reader.update_start_pos(11.5, 21.5)
+            self.reader.update_z_start_pos(30)
+
+        self.assertTrue(self.wait_for(lambda: self.loaded or self.failed))
+        self.assertEqual(self.failed, [])
+        self.assertEqual((self.loaded[0].width(), self.loaded[0].height()), (4000, 3000))
+        self.assertEqual(self.reader.saves, 1)
+        with ZipFileReader(self.job) as saved:
+            self.assertEqual(saved.archive.position, (11.5, 21.5))
+
+    def test_save_while_prefetching(self):
+        self.loader.prefetch(self.reader, [0, 1, 2])
+        self.loader.finish()
+        with self.reader.transaction():
+            self.reader.update_start_pos(12.5, 22.5)
+        self.assertEqual(self.loader._prefetches, {})
+        # the layers decode from the saved archive
+        codes = self.reader.read_layer_codes(2)
+        self.assertEqual(codes.shape, (3000, 4000))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import collections
+import math
+from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5.QtCore import Qt
+from imaging import codes_to_qimage, downsample_codes
+
+
+class TiledImageItem(QtWidgets.QGraphicsItem):
+    """
+    Graphics item showing layer codes as a pyramid of tiles.
+
+    Level n of the pyramid holds the codes reduced by 2**n with downsample_codes, so thin
+    traces stay visible when zoomed out. Only the tiles inside the exposed rectangle are
+    painted, from the level that matches the current zoom. Tiles are turned into pixmaps
+    when they are first painted and kept in an LRU cache of at most max_tiles pixmaps.
+    The levels themselves are built the first time they are needed. A low resolution
+    preview can be stretched over the size of the full resolution image, so the item
+    has its final geometry before the image is decoded.
+    """
+    TILE_SIZE = 512
+    LEVEL_COUNT = 6
+
+    def __init__(self, parent=None, max_tiles=128):
+        """
+        Args:
+            parent (QGraphicsItem): The parent item.
+            max_tiles (int): Number of tile pixmaps kept in the tile cache.
+        """
+        super(TiledImageItem, self).__init__(parent)
+        self.max_tiles = max_tiles
+        self._levels = []
+        self._colorTable = []
+        self._size = QtCore.QSizeF()
+        self._tiles = collections.OrderedDict()
+        self.setFlag(QtWidgets.QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
+    def setImage(self, image=None, size=None):
+        """
+        Show an image, replacing the current one.
+
+        Args:
+            image (QImage): An image made by imaging.codes_to_qimage, None to clear the item.
+            size (QSizeF): The size of the full resolution image when image is a preview of
+                it, the image is stretched over it. The size of image by default.
+        """
+        self.prepareGeometryChange()
+        self._tiles.clear()
+        if image is None or image.isNull():
+            self._levels = []
+            self._colorTable = []
+            self._size = QtCore.QSizeF()
+        else:
+            self._levels = [image.ndarray]
+            self._colorTable = image.colorTable()
+            self._size = QtCore.QSizeF(image.size()) if size is None else QtCore.QSizeF(size)
+        self.update()
+
+    def isNull(self):
+        return not self._levels
+
+    def isPreview(self):
+        """
+        Check whether the image shown is a preview stretched over a larger size.
+        """
+        return bool(self._levels) and self._size != QtCore.QSizeF(self._levels[0].shape[1], self._levels[0].shape[0])
+
+    def codes(self):
+        """
+        The full resolution layer codes, None if the item is empty. The preview codes while a preview is shown.
+        """
+        return self._levels[0] if self._levels else None
+
+    def image(self):
+        """
+        The full resolution image as an Indexed8 QImage sharing memory with the codes.
+        """
+        if not self._levels:
+            return QtGui.QImage()
+        image = codes_to_qimage(self._levels[0])
+        image.setColorTable(self._colorTable)
+        return image
+
+    def boundingRect(self):
+        if not self._levels:
+            return QtCore.QRectF()
+        return QtCore.QRectF(QtCore.QPointF(0, 0), self._size)
+
+    def levelForScale(self, scale):
+        """
+        Return the pyramid level to paint at a zoom factor.
+
+        Args:
+            scale (float): Device pixels per image pixel.
+
+        Returns:
+            int: The coarsest level whose pixels are not smaller than a device pixel.
+        """
+        if scale >= 1:
+            return 0
+        return min(int(math.log2(1 / scale)), self.LEVEL_COUNT - 1)
+
+    def _level(self, level):
+        while len(self._levels) <= level:
+            self._levels.append(None)
+        if self._levels[level] is None:
+            # built straight from the full resolution codes, only the levels painted are built
+            self._levels[level] = downsample_codes(self._levels[0], 1 << level)
+        return self._levels[level]
+
+    def _tile(self, level, column, row):
+        key = (level, column, row)
+        pixmap = self._tiles.get(key)
+        if pixmap is not None:
+            self._tiles.move_to_end(key)
+            return pixmap
+        size = self.TILE_SIZE
+        codes = self._level(level)[row * size:(row + 1) * size, column * size:(column + 1) * size]
+        image = codes_to_qimage(codes)
+        image.setColorTable(self._colorTable)
+        pixmap = QtGui.QPixmap.fromImage(image)
+        self._tiles[key] = pixmap
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return pixmap
+
+    def paint(self, painter, option, widget=None):
+        if not self._levels:
+            return
+        outline = self.boundingRect()
+        exposed = option.exposedRect.intersected(outline)
+        if exposed.isEmpty():
+            return
+        height, width = self._levels[0].shape
+        bounds = QtCore.QRectF(0, 0, width, height)
+        painter.save()
+        if bounds != outline:
+            # a preview, painted in its own pixels stretched over the full resolution outline
+            stretch = QtGui.QTransform.fromScale(outline.width() / width, outline.height() / height)
+            exposed = stretch.inverted()[0].mapRect(exposed).intersected(bounds)
+            painter.setTransform(stretch, True)
+        level = self.levelForScale(option.levelOfDetailFromTransform(painter.worldTransform()))
+        step = 1 << level
+        span = self.TILE_SIZE * step
+
+        painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform, False)
+        first_column, last_column = int(exposed.left() // span), int(math.ceil(exposed.right() / span))
+        first_row, last_row = int(exposed.top() // span), int(math.ceil(exposed.bottom() / span))
+        for row in range(first_row, last_row):
+            for column in range(first_column, last_column):
+                pixmap = self._tile(level, column, row)
+                x, y = column * span, row * span
+                # tiles on the right and bottom edges may cover less than a full level pixel
+                width = min(pixmap.width() * step, bounds.width() - x)
+                height = min(pixmap.height() * step, bounds.height() - y)
+                painter.drawPixmap(QtCore.QRectF(x, y, width, height), pixmap,
+                                   QtCore.QRectF(0, 0, width / step, height / step))
+        painter.restore()
+
+        if option.state & QtWidgets.QStyle.State_Selected:
+            pen = QtGui.QPen(Qt.white, 0, Qt.DashLine)
+            painter.setPen(pen)
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(outline)
@@ -1,13 +1,13 @@
 # Imports
-import zipfile
 import sys
 import datetime
 import shutil
 import os
-import pandas as pd
 from PyQt6 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import QFileDialog, QApplication
 from UI_Main import Ui_MainWindow
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from pcbjc import PcbjcArchive
 
 
 
@@ -68,15 +68,11 @@ def read_resolution(file_path):
         global di_resolution
         global machine_resolution
         global path
-        archive = zipfile.ZipFile(file_path[0], 'r')
-        imgfile = archive.open('pcbj.info')
-        data = pd.read_json(imgfile, orient='index').to_dict()
-        ci_resolution = data[0]['Separations'][0]['ResolutionInUM']
-        di_resolution = data[0]['Separations'][1]['ResolutionInUM']
+        data = {}
+        with PcbjcArchive(file_path[0]) as archive:
+            ci_resolution = archive.resolution(0)
+            di_resolution = archive.resolution(1)
         ui.textBrowser.setPlainText('the resolution of PJ is: '+str(ci_resolution['PrintAxis']))
-        # closing files
-        archive.close()
-        imgfile.close()
         
         # read the resolution of the printer:
 
@@ -1,12 +1,12 @@
 # Imports
-import zipfile
 import os
 import sys
-import json
-import pandas as pd
+import multiprocessing
 from PyQt6 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import QFileDialog, QApplication
 from UI_Main import Ui_MainWindow
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from pcbjc import read_info, patch_info
 
 
 def change_info_file(file_path):
@@ -23,14 +23,10 @@ def change_info_file(file_path):
         dict: The modified or original data, as a dictionary.
     """
     try:
-        archive = zipfile.ZipFile(file_path[0], 'r')
-        imgfile = archive.open('pcbj.info')
-        data = pd.read_json(imgfile, orient='index').to_dict()
-        for layer in data[0]['Layers']:
+        data = read_info(file_path[0])
+        for layer in data['Layers']:
             layer.pop("LayerStartPosZInUM")
-        data[0].pop('Recipe')
-        archive.close()
-        imgfile.close()
+        data.pop('Recipe')
         save_data(file_path[0],data)
     except KeyError:
         ui.textBrowser.setPlainText('strange file version.... ( no Recipe parameter in info file)')
@@ -41,24 +37,14 @@ def save_data(file_path,data):
 
 Args:
     file_path (str): The path to the ZIP archive file to save the data to.
-    data (list): A list of dictionaries representing the data to save to the 'pcbj.info' file.
+    data (dict): The pcbj.info dictionary to save to the 'pcbj.info' file.
 
 Returns:
     None
 '''
     try:
-        temp_path = file_path + '.tmp'
-        # Open the original archive and the temporary archive
-        with zipfile.ZipFile(file_path, 'r') as original_archive, zipfile.ZipFile(temp_path, 'w') as temp_archive:
-            # Iterate over the original archive's files, adding them to the temporary archive,
-            # except for the one we want to delete
-            for original_file in original_archive.infolist():
-                if original_file.filename != 'pcbj.info':
-                    temp_archive.writestr(original_file, original_archive.read(original_file.filename))
-        os.remove(file_path)
-        os.rename(temp_path, file_path)
-        archive = zipfile.ZipFile(file_path, 'a')
-        archive.writestr('pcbj.info', json.dumps(data[0], indent=4).encode('utf-8'))
+        # copy the layer bitmaps as they are and swap only the pcbj.info entry
+        patch_info(file_path, data)
         ui.textBrowser.setPlainText('the data saved succesfully')
     except KeyError:
         ui.textBrowser.setPlainText('the data saved succesfully')
@@ -109,6 +95,11 @@ def finish():
     sys.exit(app.exec())
 # Main Code
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        # headless batch mode: adoptor <folder or glob> ...
+        import batch
+        sys.exit(batch.main(sys.argv[1:]))
 
     # file_path=''
     # create application
@@ -6,7 +6,7 @@ block_cipher = None
 
 a = Analysis(
     ['adoptor.py'],
-    pathex=[],
+    pathex=['../common'],
     binaries=[],
     datas=[],
     hiddenimports=[],
@@ -0,0 +1,148 @@
+# Imports
+import argparse
+import concurrent.futures
+import glob
+import multiprocessing
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from pcbjc import read_info, patch_info
+
+
+def needs_adoption(info):
+    """
+    Check whether a pcbj.info dictionary still has parameters the LDM machine does not accept.
+
+    Args:
+        info (dict): The pcbj.info dictionary.
+
+    Returns:
+        bool: True if the file has a 'Recipe' key or a layer with 'LayerStartPosZInUM'.
+    """
+    if 'Recipe' in info:
+        return True
+    return any('LayerStartPosZInUM' in layer for layer in info.get('Layers', []))
+
+
+def adopt_info(info):
+    """
+    Remove the 'Recipe' key and the 'LayerStartPosZInUM' attribute of each layer, in place.
+
+    Args:
+        info (dict): The pcbj.info dictionary.
+
+    Returns:
+        dict: The same dictionary, ready for the LDM machine.
+    """
+    for layer in info.get('Layers', []):
+        layer.pop('LayerStartPosZInUM', None)
+    info.pop('Recipe', None)
+    return info
+
+
+def convert_file(file_path):
+    """
+    Adopt one pcbjc file to the LDM requirements. Runs in a worker process.
+
+    Files that already meet the requirements are left untouched.
+
+    Args:
+        file_path (str): The path to the .pcbjc file.
+
+    Returns:
+        tuple: (file path, status, seconds spent, error message). The status is 'converted',
+        'skipped' for a file that already meets the requirements or 'failed', the error
+        message is empty unless the conversion failed.
+    """
+    start = time.perf_counter()
+    try:
+        info = read_info(file_path)
+        if not needs_adoption(info):
+            return file_path, 'skipped', time.perf_counter() - start, ''
+        patch_info(file_path, adopt_info(info))
+        return file_path, 'converted', time.perf_counter() - start, ''
+    except Exception as exc:
+        return file_path, 'failed', time.perf_counter() - start, f'{type(exc).__name__}: {exc}'
+
+
+def find_pcbjc_files(targets, recursive=False):
+    """
+    Expand directories and glob patterns into a sorted list of .pcbjc files.
+
+    Args:
+        targets (list): Directories, glob patterns or file paths.
+        recursive (bool): Also look into the sub folders of the given directories.
+
+    Returns:
+        list: The unique .pcbjc file paths found.
+    """
+    files = set()
+    for target in targets:
+        if os.path.isdir(target):
+            # every file is listed and filtered below, so *.PCBJC is found on case sensitive file systems too
+            pattern = os.path.join(target, '**', '*') if recursive else os.path.join(target, '*')
+            paths = glob.glob(pattern, recursive=recursive)
+        else:
+            paths = glob.glob(target, recursive=True)
+        files.update(path for path in paths if path.lower().endswith('.pcbjc') and os.path.isfile(path))
+    return sorted(files)
+
+
+def batch_convert(files, workers=None):
+    """
+    Convert a list of pcbjc files in parallel with a process pool and print a summary.
+
+    Args:
+        files (list): The .pcbjc file paths to convert.
+        workers (int): Number of worker processes, by default one per CPU.
+
+    Returns:
+        list: The result tuples of convert_file, in the order of files.
+    """
+    start = time.perf_counter()
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(convert_file, files):
+            file_path, status, seconds, error = result
+            print(f'{status:<10}{seconds:8.2f}s  {file_path}')
+            results.append(result)
+
+    failed = [result for result in results if result[1] == 'failed']
+    print()
+    print(f"{len(files)} files in {time.perf_counter() - start:.2f}s: "
+          f"{sum(result[1] == 'converted' for result in results)} converted, "
+          f"{sum(result[1] == 'skipped' for result in results)} skipped, "
+          f"{len(failed)} failed")
+    for file_path, _, _, error in failed:
+        print(f'  {file_path}: {error}')
+    return results
+
+
+def main(argv=None):
+    """
+    Command line entry point of the batch mode.
+
+    Args:
+        argv (list): The command line arguments, sys.argv[1:] by default.
+
+    Returns:
+        int: The exit code, 1 if any file failed to convert.
+    """
+    parser = argparse.ArgumentParser(description='Adopt every .pcbjc file in the given folders or glob patterns to the LDM machine.')
+    parser.add_argument('targets', nargs='+', help='folders, glob patterns or .pcbjc files')
+    parser.add_argument('-r', '--recursive', action='store_true', help='also convert the files in sub folders')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+
+    files = find_pcbjc_files(args.targets, args.recursive)
+    if not files:
+        print('no .pcbjc files found')
+        return 1
+    results = batch_convert(files, args.workers)
+    return 1 if any(result[1] == 'failed' for result in results) else 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
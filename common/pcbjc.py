@@ -0,0 +1,459 @@
+import contextlib
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zipfile
+
+
+INFO_FILE = 'pcbj.info'
+
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_DATA_DESCRIPTOR_FLAG = 0x08
+_ZIP64_EXTRA_ID = 0x0001
+_COPY_CHUNK_SIZE = 1024 * 1024
+# separators around the top level keys of pcbj.info, see read_info_value
+_JSON_OPEN = re.compile(r'\s*\{\s*')
+_JSON_COLON = re.compile(r'\s*:\s*')
+_JSON_COMMA = re.compile(r'\s*,?\s*')
+
+
+class PcbjcArchive:
+    """
+    Read access to a .pcbjc print job archive shared by all the DF-IV tools.
+
+    The zip central directory is read once when the archive is opened and pcbj.info is
+    parsed with the standard json module. Layer bitmaps are only read from the archive
+    when they are asked for, so tools that only need the job metadata never touch them.
+    Stored members can be viewed straight from a memory map of the archive, without
+    being copied, see member_view. Saving or closing the archive waits until the views
+    of the other threads are released.
+    """
+
+    def __init__(self, file_path):
+        """
+        Open a pcbjc archive and parse its pcbj.info file.
+
+        Args:
+            file_path (str): The path to the .pcbjc file.
+
+        Raises:
+            KeyError: If the archive has no pcbj.info file.
+        """
+        self.file_path = file_path
+        self._mmap = None
+        # guards the creation of the memory map and the count of member views in use,
+        # member_view runs on several threads and save_info and close wait for the views
+        self._mmap_lock = threading.Lock()
+        self._views_released = threading.Condition(self._mmap_lock)
+        self._views = 0
+        self._closing = False
+        self._thread_views = threading.local()
+        self._buffers = threading.local()
+        self.zip_file = zipfile.ZipFile(file_path, 'r')
+        try:
+            self.reload_info()
+        except Exception:
+            self.zip_file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Close the underlying zip file and the memory map of the archive.
+
+        Waits until the member views of the other threads are released.
+
+        Raises:
+            BufferError: If the calling thread still holds a member view, or an array made
+                from a view outlived it. Nothing is closed then.
+        """
+        with self._exclusive():
+            self._close()
+
+    def _close(self):
+        self._close_mmap()
+        if self.zip_file is not None:
+            self.zip_file.close()
+            self.zip_file = None
+
+    def _close_mmap(self):
+        if self._mmap is None:
+            return
+        try:
+            self._mmap.close()
+        except BufferError:
+            raise BufferError('memory of %s viewed with member_view is still in use after the view was released, '
+                              'copy the data before leaving the with block' % self.file_path) from None
+        self._mmap = None
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """
+        Wait until no member view is in use and keep new ones from starting, for closing or saving.
+        """
+        if getattr(self._thread_views, 'count', 0):
+            raise BufferError('%s cannot be saved or closed while this thread holds views returned by member_view, '
+                              'release them first' % self.file_path)
+        with self._views_released:
+            while self._closing:
+                self._views_released.wait()
+            self._closing = True
+            while self._views:
+                self._views_released.wait()
+        try:
+            yield
+        finally:
+            with self._views_released:
+                self._closing = False
+                self._views_released.notify_all()
+
+    @property
+    def layers(self) -> list:
+        """
+        The list of layer dictionaries of the print job.
+        """
+        return self.info['Layers']
+
+    @property
+    def layer_count(self) -> int:
+        """
+        The number of layers of the print job.
+        """
+        return len(self.info['Layers'])
+
+    @property
+    def separations(self) -> list:
+        """
+        The job level separation dictionaries, CI first and DI second.
+        """
+        return self.info['Separations']
+
+    @property
+    def recipe(self) -> str:
+        """
+        The name of the recipe the job was sliced with, or None for files without one.
+        """
+        return self.info.get('Recipe')
+
+    @property
+    def position(self) -> tuple:
+        """
+        The start position of the job in millimeters as a (GroupAxis, PrintAxis) tuple.
+        """
+        position = self.info.get('PositionInMM', {})
+        return float(position.get('GroupAxis', 0.0)), float(position.get('PrintAxis', 0.0))
+
+    def resolution(self, separation=0) -> dict:
+        """
+        Return the resolution of a separation.
+
+        Args:
+            separation (int): 0 for the CI separation, 1 for the DI separation.
+
+        Returns:
+            dict: The 'ResolutionInUM' dictionary, with 'PrintAxis' and 'GroupAxis' keys.
+        """
+        return self.info['Separations'][separation]['ResolutionInUM']
+
+    def layer_files(self, index) -> tuple:
+        """
+        Return the bitmap member names of a layer.
+
+        Args:
+            index (int): The layer index, negative values count from the last layer.
+
+        Returns:
+            tuple: (CI file, DI file), an empty string for a separation that does not print.
+        """
+        separations = self.info['Layers'][index]['Separations']
+        return separations[0]['File'], separations[1]['File']
+
+    def reload_info(self) -> dict:
+        """
+        Parse pcbj.info from the archive again, dropping changes that were not saved.
+
+        Returns:
+            dict: The parsed pcbj.info file, also stored in info.
+        """
+        with self.zip_file.open(INFO_FILE) as info_file:
+            self.info = json.load(info_file)
+        return self.info
+
+    def read_member(self, name) -> bytes:
+        """
+        Read and decompress one member of the archive.
+
+        Args:
+            name (str): The member name, as found in pcbj.info.
+
+        Returns:
+            bytes: The content of the member.
+        """
+        return self.zip_file.read(name)
+
+    @contextlib.contextmanager
+    def member_view(self, name):
+        """
+        View the content of a member as a read-only buffer, copying as little as possible.
+
+        Stored members are viewed in place through a memory map of the archive. Compressed
+        members are decompressed in chunks into a buffer that is reused by the next view
+        of the same thread. The view is released when the with block ends.
+
+        Views are counted: save_info and close wait until the views of the other threads
+        are released, and views asked for meanwhile wait for the save to finish. Do not keep
+        NumPy arrays made from a view after the block, the memory map cannot be closed
+        while they exist.
+
+        Example:
+            with archive.member_view(name) as data:
+                mask = decode(data)
+
+        Args:
+            name (str): The member name, as found in pcbj.info.
+
+        Yields:
+            memoryview: Read-only view of the member's bytes.
+        """
+        with self._views_released:
+            while self._closing:
+                self._views_released.wait()
+            self._views += 1
+        self._thread_views.count = getattr(self._thread_views, 'count', 0) + 1
+        try:
+            with self._view(name) as view:
+                yield view
+        finally:
+            self._thread_views.count -= 1
+            with self._views_released:
+                self._views -= 1
+                self._views_released.notify_all()
+
+    def _view(self, name) -> memoryview:
+        member = self.zip_file.getinfo(name)
+        if member.compress_type == zipfile.ZIP_STORED and not member.flag_bits & 0x1:
+            with self._mmap_lock:
+                if self._mmap is None:
+                    with open(self.file_path, 'rb') as archive_file:
+                        self._mmap = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+                archive_map = self._mmap
+            header = archive_map[member.header_offset:member.header_offset + _LOCAL_HEADER.size]
+            if len(header) != _LOCAL_HEADER.size or header[:4] != zipfile.stringFileHeader:
+                raise zipfile.BadZipFile('Bad local file header for ' + name)
+            name_length, extra_length = _LOCAL_HEADER.unpack(header)[-2:]
+            offset = member.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+            with memoryview(archive_map) as whole:
+                return whole[offset:offset + member.file_size]
+
+        size = member.file_size
+        buffer = getattr(self._buffers, 'data', None)
+        if buffer is None or len(buffer) < size:
+            buffer = self._buffers.data = bytearray(size)
+        view = memoryview(buffer)
+        position = 0
+        with self.zip_file.open(member) as member_file:
+            while position < size:
+                count = member_file.readinto(view[position:min(size, position + _COPY_CHUNK_SIZE)])
+                if not count:
+                    raise zipfile.BadZipFile('Truncated data for ' + name)
+                position += count
+        return view[:size].toreadonly()
+
+    def read_layer(self, index) -> tuple:
+        """
+        Read the bitmaps of a layer.
+
+        Args:
+            index (int): The layer index, negative values count from the last layer.
+
+        Returns:
+            tuple: (CI bytes, DI bytes), None for a separation that does not print.
+        """
+        return tuple(self.read_member(name) if name else None for name in self.layer_files(index))
+
+    def save_info(self) -> int:
+        """
+        Write the (modified) info dictionary back to the archive with patch_info.
+
+        The zip file is closed while the archive is replaced and opened again afterwards.
+
+        Returns:
+            int: The number of bytes written.
+
+        Waits until the member views of the other threads are released, new views wait
+        for the save to finish.
+
+        Raises:
+            BufferError: If the calling thread still holds a member view, or an array made
+                from a view outlived it. Nothing is written then.
+        """
+        with self._exclusive():
+            self._close()
+            try:
+                return patch_info(self.file_path, self.info)
+            finally:
+                self.zip_file = zipfile.ZipFile(self.file_path, 'r')
+
+
+def read_info(file_path) -> dict:
+    """
+    Read the pcbj.info dictionary of a pcbjc archive without touching the layer bitmaps.
+
+    Args:
+        file_path (str): The path to the .pcbjc file.
+
+    Returns:
+        dict: The parsed pcbj.info file.
+    """
+    with PcbjcArchive(file_path) as archive:
+        return archive.info
+
+
+def read_info_value(file_path, key, default=None):
+    """
+    Read one top level value of pcbj.info without parsing the rest of the file.
+
+    The top level keys of pcbj.info are walked in order and decoding stops at the key,
+    so a key written before the layer list is read without decoding the layers, and
+    any other key costs at most a full parse. The archive is closed before returning.
+
+    Args:
+        file_path (str): The path to the .pcbjc file.
+        key (str): The top level key of pcbj.info, like 'Recipe'.
+        default: The value returned if pcbj.info has no such key.
+
+    Returns:
+        The decoded value of the key.
+
+    Raises:
+        KeyError: If the archive has no pcbj.info file.
+        ValueError: If pcbj.info is not a JSON object.
+    """
+    with zipfile.ZipFile(file_path, 'r') as zip_file:
+        text = zip_file.read(INFO_FILE).decode('utf-8-sig')
+    decoder = json.JSONDecoder()
+    start = _JSON_OPEN.match(text)
+    if start is None:
+        raise ValueError('pcbj.info is not a JSON object')
+    position = start.end()
+    while position < len(text) and text[position] != '}':
+        name, position = decoder.raw_decode(text, position)
+        position = _JSON_COLON.match(text, position).end()
+        if name == key:
+            return decoder.raw_decode(text, position)[0]
+        _, position = decoder.raw_decode(text, position)
+        position = _JSON_COMMA.match(text, position).end()
+    return default
+
+
+def _strip_zip64_extra(extra):
+    """
+    Remove the zip64 field from an extra field block, zipfile adds a fresh one when needed.
+    """
+    stripped = b''
+    position = 0
+    while position + 4 <= len(extra):
+        field_id, size = struct.unpack('<HH', extra[position:position + 4])
+        if field_id != _ZIP64_EXTRA_ID:
+            stripped += extra[position:position + 4 + size]
+        position += 4 + size
+    return stripped
+
+
+def _copy_zip_info(member, date_time=None):
+    """
+    Return a new ZipInfo with the name, attributes and compression settings of member.
+    """
+    zinfo = zipfile.ZipInfo(member.filename, date_time or member.date_time)
+    for attribute in ('compress_type', 'comment', 'create_system', 'create_version',
+                      'extract_version', 'reserved', 'flag_bits', 'volume', 'internal_attr',
+                      'external_attr', 'CRC', 'compress_size', 'file_size'):
+        setattr(zinfo, attribute, getattr(member, attribute))
+    zinfo.extra = _strip_zip64_extra(member.extra)
+    # sizes and CRC are known up front, so the copy does not need a data descriptor
+    zinfo.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+    return zinfo
+
+
+def _copy_raw_member(source, member, target):
+    """
+    Copy the still compressed data of a member from the source file into a zip being written.
+
+    Args:
+        source (file): The source archive opened in binary mode.
+        member (ZipInfo): The member to copy, as listed by the source archive.
+        target (ZipFile): The archive being written.
+    """
+    source.seek(member.header_offset)
+    header = source.read(_LOCAL_HEADER.size)
+    if len(header) != _LOCAL_HEADER.size or header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile('Bad local file header for ' + member.filename)
+    name_length, extra_length = _LOCAL_HEADER.unpack(header)[-2:]
+    source.seek(member.header_offset + _LOCAL_HEADER.size + name_length + extra_length)
+
+    zinfo = _copy_zip_info(member)
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    zinfo.header_offset = target.fp.tell()
+    target.fp.write(zinfo.FileHeader(zip64))
+    remaining = zinfo.compress_size
+    while remaining:
+        chunk = source.read(min(_COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile('Truncated data for ' + member.filename)
+        target.fp.write(chunk)
+        remaining -= len(chunk)
+
+    # register the member the same way ZipFile.write does, so close() lists it
+    target.start_dir = target.fp.tell()
+    target.filelist.append(zinfo)
+    target.NameToInfo[zinfo.filename] = zinfo
+
+
+def patch_info(file_path, info) -> int:
+    """
+    Replace pcbj.info in a pcbjc archive without recompressing the layer bitmaps.
+
+    Every other member is copied raw, compressed data and compression settings as they
+    are, only pcbj.info is encoded again with its original compression method. The new
+    archive is written next to the original and swapped in with os.replace, so the file
+    is either fully updated or left untouched.
+
+    Args:
+        file_path (str): The path to the .pcbjc file.
+        info (dict): The pcbj.info dictionary to store.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    temp_path = file_path + '.tmp'
+    info_data = json.dumps(info, indent=4).encode('utf-8')
+    try:
+        with open(file_path, 'rb') as source, \
+                zipfile.ZipFile(source, 'r') as original, \
+                zipfile.ZipFile(temp_path, 'w', allowZip64=True) as target:
+            target.comment = original.comment
+            info_written = False
+            for member in original.infolist():
+                if member.filename != INFO_FILE:
+                    _copy_raw_member(source, member, target)
+                    continue
+                if not info_written:
+                    target.writestr(_copy_zip_info(member, time.localtime()[:6]), info_data)
+                    info_written = True
+            if not info_written:
+                target.writestr(INFO_FILE, info_data, compress_type=zipfile.ZIP_DEFLATED)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return os.path.getsize(file_path)